@@ -1,39 +1,54 @@
 import streamlit as st
 import json
 import os
-import qrcode
-from pyzbar.pyzbar import decode
-from PIL import Image
-import cv2
-import numpy as np
-from difflib import SequenceMatcher
+from qr_encode import DEFAULT_ENCODE_PROFILE, DEFAULT_PRINT_SIZE_MM, encode_profile_sidebar, save_qr_png
+import profile_codec
+import qr_chunks
+from qr_chunks import part_filename
+from decode_ladder import get_default_ladder
+from scan_pipeline import ScanPipeline, parse_source
+from similarity import profile_similarity
+from profile_store import get_default_store
+from profile_index import get_default_index, update_default_index
+from instrumentation import profiling_sidebar, stage
+from warmup import start_warmup
 
 # Directory to save files
 SAVE_DIR = "saved_data"
 os.makedirs(SAVE_DIR, exist_ok=True)
 
+# Camera index, video file or stream URL for live scanning
+CAMERA_SOURCE = os.environ.get("QRDNA_CAMERA", "1")
+
 # Helper Functions
-def save_json_file(data, filename):
-    filepath = os.path.join(SAVE_DIR, filename)
-    with open(filepath, "w") as json_file:
-        json.dump(data, json_file, indent=4)
-    return filepath
-
-def generate_qr_code(data, filename):
-    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill="black", back_color="white")
+def save_profile(data):
+    try:
+        profile_id = get_default_store().insert(data)
+    except ValueError as e:
+        st.error(f"Profile not saved: {e}")
+        return None
+    update_default_index(profile_id, data)
+    return profile_id
+
+def generate_qr_code(data, filename, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
     qr_filepath = os.path.join(SAVE_DIR, filename)
-    img.save(qr_filepath)
-    return qr_filepath
+    return save_qr_png(data, qr_filepath, profile, print_size_mm)
+
+def generate_qr_codes(data, filename, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM, chunked=False):
+    # A sequence of small codes when chunked (a single code if the payload already fits)
+    parts = qr_chunks.split(data, encode_profile=profile) if chunked else [data]
+    return [generate_qr_code(part, part_filename(filename, index, len(parts)), profile, print_size_mm)
+            for index, part in enumerate(parts, 1)]
+
+def qr_captions(count, caption):
+    return [caption] if count == 1 else [f"{caption} ({index} of {count})" for index in range(1, count + 1)]
 
 def decode_qr_code(uploaded_file):
     try:
-        image = Image.open(uploaded_file)
-        qr_data = decode(image)
-        if qr_data:
-            return qr_data[0].data.decode("utf-8")
+        # Cheap downscaled pass first, sharper/binarized passes only on failure
+        result = get_default_ladder().decode(uploaded_file)
+        if result.symbols:
+            return profile_codec.to_json_text(result.symbols[0].data.decode("utf-8"))
         else:
             return "No QR code found in the uploaded image."
     except Exception as e:
@@ -43,44 +58,40 @@ def calculate_similarity(profile1, profile2):
     """
     Compares two JSON profiles and calculates similarity percentage.
     """
-    profile1_text = json.dumps(profile1, sort_keys=True)
-    profile2_text = json.dumps(profile2, sort_keys=True)
-    similarity = SequenceMatcher(None, profile1_text, profile2_text).ratio()
-    return similarity * 100
+    return profile_similarity(profile1, profile2)
 
-def scan_qr_code_from_camera():
+def scan_qr_code_from_camera(source=CAMERA_SOURCE):
     """
-    Scans QR codes using the device's camera and extracts data.
+    Scans QR codes using the device's camera (or QRDNA_CAMERA) and extracts data.
     """
     st.write("**Starting camera... Press 'Stop Scanning' to quit.**")
-    cap = cv2.VideoCapture(1)
     qr_data = None
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
+    # Capture and decode run on background threads; we wait for the first complete payload.
+    # Chunked profiles are reassembled from their codes in whatever order they are scanned.
+    reassembler = qr_chunks.Reassembler()
+    progress = st.empty()
+    with ScanPipeline(parse_source(source)) as pipeline:
+        while not pipeline.finished:
+            result = pipeline.get_result(timeout=0.5)
+            if result:
+                qr_data = reassembler.add(result.data)
+                if qr_data is not None:
+                    break
+                for sequence_id, received, count in reassembler.progress():
+                    progress.write(f"Collected {received} of {count} codes...")
+        while qr_data is None:
+            result = pipeline.get_result(timeout=0)
+            if result is None:
+                break
+            qr_data = reassembler.add(result.data)
+        progress.empty()
+        if qr_data is None and pipeline.capture_failed:
             st.error("Failed to access camera.")
-            break
-
-        decoded_objects = decode(frame)
-        for obj in decoded_objects:
-            qr_data = obj.data.decode("utf-8")
-            points = obj.polygon
-            if len(points) == 4:
-                pts = np.array([(p.x, p.y) for p in points], dtype=np.int32)
-                cv2.polylines(frame, [pts], isClosed=True, color=(0, 255, 0), thickness=3)
-
-            # Display detected QR data
-            cv2.putText(frame, f"Data: {qr_data}", (obj.rect.left, obj.rect.top - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        stats = pipeline.summary()
 
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-       # st.image(frame_rgb, caption="Scanning...", use_container_width=True)
-
-        if qr_data:
-            break
-
-    cap.release()
+    st.caption(f"Decode latency p50 {stats['latency_p50_ms']} ms, "
+               f"p95 {stats['latency_p95_ms']} ms, {stats['dropped_frames']} stale frames dropped")
     return qr_data
 
 def live_compare(default_profile):
@@ -94,7 +105,7 @@ def live_compare(default_profile):
         scanned_data = scan_qr_code_from_camera()
         if scanned_data:
             try:
-                scanned_profile = json.loads(scanned_data)
+                scanned_profile = profile_codec.loads(scanned_data)
                 st.success("Scanned Profile:")
                 st.json(scanned_profile)
 
@@ -107,7 +118,17 @@ def live_compare(default_profile):
                     st.info("Profiles are highly similar.")
                 else:
                     st.warning("Profiles are significantly different.")
-            except json.JSONDecodeError:
+
+                # Match the scan against every stored profile
+                st.subheader("Closest Saved Profiles")
+                matches = get_default_index().top_k(scanned_profile, k=5)
+                if matches:
+                    for profile_id, score in matches:
+                        matched = get_default_store().get(profile_id) or {}
+                        st.write(f"#{profile_id} {matched.get('name', '')}: **{score:.2f}%**")
+                else:
+                    st.write("No saved profiles to match against.")
+            except ValueError:
                 st.error("Scanned QR code does not contain valid profile data.")
 
 def compare_profiles():
@@ -120,8 +141,9 @@ def compare_profiles():
 
     if file1 and file2:
         try:
-            profile1 = json.load(file1)
-            profile2 = json.load(file2)
+            with stage("json.parse"):
+                profile1 = json.load(file1)
+                profile2 = json.load(file2)
 
             similarity = calculate_similarity(profile1, profile2)
             st.write(f"**Profile Similarity:** {similarity:.2f}%")
@@ -137,6 +159,8 @@ def compare_profiles():
 
 # Streamlit App
 def main():
+    # Imports NumPy/OpenCV/SciPy in the background when QRDNA_WARMUP=1
+    start_warmup()
     st.title("QR Code Profile Management")
 
     # Default profile for live comparison
@@ -166,6 +190,9 @@ def main():
         tastes = st.text_area("Tastes (comma-separated)").split(",")
         skills = st.text_area("Skills (comma-separated)").split(",")
         preferences = st.text_area("Preferences (comma-separated)").split(",")
+        compact = st.checkbox("Compact QR payload (smaller, faster to scan)")
+        chunked = st.checkbox("Split into a sequence of small QR codes (large profiles)")
+        encode_profile, print_size_mm = encode_profile_sidebar()
 
         profile = {
             "name": name,
@@ -181,10 +208,11 @@ def main():
 
         if st.button("Generate"):
             filename = f"{name.lower().replace(' ', '_')}.json"
-            save_json_file(profile, filename)
+            save_profile(profile)
             qr_filename = f"{name.lower().replace(' ', '_')}_qr.png"
-            qr_filepath = generate_qr_code(json.dumps(profile), qr_filename)
-            st.image(qr_filepath, caption="Generated QR Code")
+            qr_filepaths = generate_qr_codes(profile_codec.dumps(profile, compact=compact), qr_filename,
+                                             encode_profile, print_size_mm, chunked)
+            st.image(qr_filepaths, caption=qr_captions(len(qr_filepaths), "Generated QR Code"))
             st.download_button("Download JSON", json.dumps(profile, indent=4), filename)
 
     elif choice == "Compare Profiles":
@@ -193,5 +221,7 @@ def main():
     elif choice == "Live Compare Default Profile":
         live_compare(default_profile)
 
+    profiling_sidebar()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,53 +1,80 @@
 # app.py
 import streamlit as st
-import qrcode
-from io import BytesIO
-import base64
 import json
 import os
-from PIL import Image
-import pyzbar.pyzbar as pyzbar
+from functools import partial
+from qr_cache import get_default_cache
+from qr_encode import (DEFAULT_ENCODE_PROFILE, DEFAULT_PRINT_SIZE_MM, encode_params, encode_profile_sidebar,
+                       qr_png_bytes)
+import profile_codec
+import qr_chunks
+from qr_chunks import part_filename
+from decode_ladder import get_default_ladder
+from profile_store import get_default_store
+from profile_index import update_default_index
+from instrumentation import profiling_sidebar, stage
+from warmup import start_warmup
 
 # Directory to save files
 SAVE_DIR = "saved_data"
 os.makedirs(SAVE_DIR, exist_ok=True)
 
-def generate_qr_code(data):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    return buffered.getvalue()
-
-def save_json_file(data, filename):
-    filepath = os.path.join(SAVE_DIR, filename)
-    with open(filepath, "w") as json_file:
-        json.dump(data, json_file, indent=4)
-    return filepath
+def _encoder(profile, print_size_mm):
+    # Cache key params and the matching encoder for an encode profile
+    return encode_params(profile, print_size_mm), partial(qr_png_bytes, profile=profile, print_size_mm=print_size_mm)
+
+def generate_qr_code(data, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
+    return get_default_cache().get_png(data, *_encoder(profile, print_size_mm))
+
+def qr_download_link(data, download_name, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
+    qr_b64 = get_default_cache().get_base64(data, *_encoder(profile, print_size_mm))
+    return f'<a href="data:image/png;base64,{qr_b64}" download="{download_name}">Download QR Code</a>'
+
+def show_qr_codes(data, caption, download_name, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM,
+                  chunked=False):
+    # A sequence of small codes when chunked (a single code if the payload already fits)
+    parts = qr_chunks.split(data, encode_profile=profile) if chunked else [data]
+    captions = [caption] if len(parts) == 1 else [f"{caption} ({i} of {len(parts)})" for i in range(1, len(parts) + 1)]
+    st.image([generate_qr_code(part, profile, print_size_mm) for part in parts], caption=captions,
+             use_column_width=True)
+    for index, part in enumerate(parts, 1):
+        st.markdown(qr_download_link(part, part_filename(download_name, index, len(parts)), profile, print_size_mm),
+                    unsafe_allow_html=True)
+
+def save_profile(data, source=None):
+    store = get_default_store()
+    if source is not None:
+        # Streamlit reruns the script on every interaction; an upload already stored keeps its id
+        profile_id = store.id_for_source(source)
+        if profile_id is not None:
+            return profile_id
+    try:
+        profile_id = store.insert(data, source)
+    except ValueError as e:
+        st.error(f"Profile not saved: {e}")
+        return None
+    update_default_index(profile_id, data)
+    return profile_id
 
 def load_json_file(filepath):
     with open(filepath, "r") as json_file:
         return json.load(json_file)
 
 def decode_qr_code(file):
-    img = Image.open(file)
-    decoded_objects = pyzbar.decode(img)
-    if decoded_objects:
-        return decoded_objects[0].data.decode("utf-8")
+    # Cheap downscaled pass first, sharper/binarized passes only on failure
+    result = get_default_ladder().decode(file)
+    if result.symbols:
+        return profile_codec.to_json_text(result.symbols[0].data.decode("utf-8"))
     return None
 
 def main():
+    # Imports NumPy/OpenCV/SciPy in the background when QRDNA_WARMUP=1
+    start_warmup()
     st.title("QR Code Generator and Decoder")
 
     # Tabs for separate sections
-    tabs = ["Contact Sharing QR Code Generator", "Load JSON File to Generate QR Code", "Load and Decode QR Code"]
+    tabs = ["Contact Sharing QR Code Generator", "Load JSON File to Generate QR Code", "Load and Decode QR Code",
+            "Bulk Decode QR Codes", "Bulk Import Profiles"]
     choice = st.sidebar.selectbox("Select an option", tabs)
 
     if choice == "Contact Sharing QR Code Generator":
@@ -68,6 +95,9 @@ def main():
         hobbies = st.text_area("Hobbies (comma-separated)", "")
         bedtime = st.text_input("Bedtime", "")
         wake_time = st.text_input("Wake Time", "")
+        compact = st.checkbox("Compact QR payload (smaller, faster to scan)")
+        chunked = st.checkbox("Split into a sequence of small QR codes (large profiles)")
+        encode_profile, print_size_mm = encode_profile_sidebar()
 
         # Generate JSON data
         data = {
@@ -89,30 +119,28 @@ def main():
 
         # Save JSON file and generate QR code
         if st.button("Save JSON and Generate QR Code"):
-            filename = f"{name.replace(' ', '_').lower()}_data.json"
-            filepath = save_json_file(data, filename)
-            st.success(f"Data saved as {filepath}")
-
-            json_data = json.dumps(data, indent=4)
-            qr_image_bytes = generate_qr_code(json_data)
-            st.image(qr_image_bytes, caption="Your QR Code", use_column_width=True)
+            profile_id = save_profile(data)
+            if profile_id is not None:
+                st.success(f"Data saved as profile #{profile_id}")
 
-            # Download link for QR code
-            qr_download_link = f'<a href="data:image/png;base64,{base64.b64encode(qr_image_bytes).decode()}" download="qr_code.png">Download QR Code</a>'
-            st.markdown(qr_download_link, unsafe_allow_html=True)
+            json_data = profile_codec.dumps(data, compact=compact, indent=4)
+            # QR code(s) with a download link each
+            show_qr_codes(json_data, "Your QR Code", "qr_code.png", encode_profile, print_size_mm, chunked)
 
     elif choice == "Load JSON File to Generate QR Code":
         st.header("Load JSON File to Generate QR Code")
         uploaded_file = st.file_uploader("Upload JSON File", type=["json"])
         if uploaded_file:
             try:
-                loaded_data = json.load(uploaded_file)
-                qr_image_bytes = generate_qr_code(json.dumps(loaded_data, indent=4))
-                st.image(qr_image_bytes, caption="QR Code from Uploaded JSON", use_column_width=True)
-
-                # Download link for QR code
-                qr_download_link = f'<a href="data:image/png;base64,{base64.b64encode(qr_image_bytes).decode()}" download="uploaded_qr_code.png">Download QR Code</a>'
-                st.markdown(qr_download_link, unsafe_allow_html=True)
+                with stage("json.parse"):
+                    loaded_data = json.load(uploaded_file)
+                compact = st.checkbox("Compact QR payload (smaller, faster to scan)")
+                chunked = st.checkbox("Split into a sequence of small QR codes (large profiles)")
+                encode_profile, print_size_mm = encode_profile_sidebar()
+                json_data = profile_codec.dumps(loaded_data, compact=compact, indent=4)
+                # QR code(s) with a download link each
+                show_qr_codes(json_data, "QR Code from Uploaded JSON", "uploaded_qr_code.png", encode_profile,
+                              print_size_mm, chunked)
             except json.JSONDecodeError:
                 st.error("Invalid JSON file. Please upload a valid JSON.")
 
@@ -120,33 +148,112 @@ def main():
         st.header("Load and Decode QR Code")
         uploaded_file = st.file_uploader("Upload QR Code Image", type=["png", "jpg", "jpeg"])
         if uploaded_file:
-            decoded_data = decode_qr_code(uploaded_file)
-            if decoded_data:
+            decoded_json = None
+            try:
+                decoded_data = decode_qr_code(uploaded_file)
+                if decoded_data:
+                    with stage("json.parse"):
+                        decoded_json = json.loads(decoded_data)
+            except ValueError as e:
+                # Truncated compact payloads and non-JSON text both end up here
+                st.error(f"Error decoding QR code: {e}")
+            else:
+                if not decoded_data:
+                    st.error("Unable to decode QR Code. Please upload a valid QR Code image.")
+
+            if decoded_json is not None:
                 st.success("QR Code Decoded Successfully!")
-                st.json(json.loads(decoded_data))
-
-                # Save decoded data to JSON file
-                decoded_json = json.loads(decoded_data)
-                save_path = save_json_file(decoded_json, "decoded_data.json")
-                st.write(f"Decoded data saved as {save_path}")
-
-                # Map data back to fields
-                st.write("### Mapped Data")
-                st.text_input("Name", decoded_json.get("name", ""))
-                st.number_input("Age", min_value=0, max_value=150, value=decoded_json.get("age", 0))
-                st.text_input("Email", decoded_json.get("email", ""))
-                st.text_input("Phone", decoded_json.get("phone", ""))
-                st.text_area("Address", decoded_json.get("address", ""))
-
-                habits = decoded_json.get("habits", {})
-                st.text_area("Morning Routine", ", ".join(habits.get("morning_routine", [])))
-                st.text_area("Dietary Preferences", ", ".join(habits.get("dietary_preferences", [])))
-                st.text_area("Hobbies", ", ".join(habits.get("hobbies", [])))
-                sleep_schedule = habits.get("sleep_schedule", {})
-                st.text_input("Bedtime", sleep_schedule.get("bedtime", ""))
-                st.text_input("Wake Time", sleep_schedule.get("wake_time", ""))
+                st.json(decoded_json)
+
+                # Save decoded data to the profile store
+                profile_id = save_profile(decoded_json, source=f"decode:{uploaded_file.file_id}")
+                if profile_id is not None:
+                    st.write(f"Decoded data saved as profile #{profile_id}")
+
+                    # Map data back to fields
+                    st.write("### Mapped Data")
+                    st.text_input("Name", decoded_json.get("name", ""))
+                    st.number_input("Age", min_value=0, max_value=150, value=decoded_json.get("age", 0))
+                    st.text_input("Email", decoded_json.get("email", ""))
+                    st.text_input("Phone", decoded_json.get("phone", ""))
+                    st.text_area("Address", decoded_json.get("address", ""))
+
+                    habits = decoded_json.get("habits", {})
+                    st.text_area("Morning Routine", ", ".join(habits.get("morning_routine", [])))
+                    st.text_area("Dietary Preferences", ", ".join(habits.get("dietary_preferences", [])))
+                    st.text_area("Hobbies", ", ".join(habits.get("hobbies", [])))
+                    sleep_schedule = habits.get("sleep_schedule", {})
+                    st.text_input("Bedtime", sleep_schedule.get("bedtime", ""))
+                    st.text_input("Wake Time", sleep_schedule.get("wake_time", ""))
+
+            with st.expander("Decode statistics"):
+                st.json(get_default_ladder().stats.summary())
+
+    elif choice == "Bulk Decode QR Codes":
+        st.header("Bulk Decode QR Codes")
+        st.write("Upload images or ZIP archives; every QR code in every image is decoded.")
+        uploaded_files = st.file_uploader("Upload QR Code Images", type=["png", "jpg", "jpeg", "zip"],
+                                          accept_multiple_files=True)
+        if uploaded_files:
+            from bulk_decode import decode_batch
+
+            results = list(decode_batch(uploaded_files))
+            symbols = sum(len(result["symbols"]) for result in results)
+            st.success(f"Decoded {symbols} QR codes from {len(results)} images.")
+            for result in results:
+                if result.get("error"):
+                    st.error(f"{result['source']}: {result['error']}")
+                elif not result["symbols"]:
+                    st.warning(f"{result['source']}: no QR code found")
+            st.dataframe([{"source": result["source"], "data": symbol["data"]}
+                          for result in results for symbol in result["symbols"]])
+            st.download_button("Download Results (JSONL)", "".join(json.dumps(result) + "\n" for result in results),
+                               "decoded_qr_codes.jsonl", mime="application/jsonl")
+
+    elif choice == "Bulk Import Profiles":
+        st.header("Bulk Import Profiles")
+        st.write("Upload a JSONL file or a JSON array of profiles. Profiles are parsed and validated one at a time "
+                 "and stored in chunks, so exports of any size work.")
+        uploaded_file = st.file_uploader("Upload Profiles", type=["jsonl", "ndjson", "json"])
+        reference_file = st.file_uploader("Reference profile to compare against (optional)", type=["json"],
+                                          key="reference_profile")
+        allow_extra = st.checkbox("Accept fields the generators don't produce")
+        if uploaded_file and st.button("Import Profiles"):
+            from profile_ingest import ingest
+
+            try:
+                reference = None
+                if reference_file:
+                    with stage("json.parse"):
+                        reference = json.load(reference_file)
+                progress_bar = st.progress(0.0, text="Importing...")
+                total_bytes = uploaded_file.size or 1
+
+                def report(stats):
+                    progress_bar.progress(min(1.0, stats.bytes_read / total_bytes),
+                                          text=f"{stats.records} records, {stats.invalid} invalid, "
+                                               f"{stats.rate:.0f} records/s")
+
+                uploaded_file.seek(0)
+                # Keyed by upload, so pressing the button twice doesn't store the profiles twice
+                stats = ingest(uploaded_file, get_default_store(), reference=reference, allow_extra=allow_extra,
+                               source_name=f"upload:{uploaded_file.file_id}", on_progress=report)
+            except json.JSONDecodeError:
+                st.error("Invalid reference profile. Please upload a valid JSON file.")
+            except ValueError as e:
+                st.error(f"Import stopped: {e}")
             else:
-                st.error("Unable to decode QR Code. Please upload a valid QR Code image.")
+                progress_bar.progress(1.0, text=f"{stats.records} records in {stats.elapsed:.1f}s")
+                st.success(f"Stored {stats.inserted} of {stats.valid} valid profiles ({stats.invalid} invalid).")
+                if stats.errors:
+                    with st.expander(f"Invalid records (first {len(stats.errors)})"):
+                        st.dataframe([{"record": error["record"], "errors": "; ".join(error["errors"])}
+                                      for error in stats.errors])
+                if reference is not None:
+                    st.write(f"**{stats.above_threshold}** profiles are at least 80% similar to the reference.")
+                    st.dataframe(stats.matches())
+
+    profiling_sidebar()
 
 if __name__ == "__main__":
     main()
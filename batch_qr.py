@@ -0,0 +1,208 @@
+"""
+Batch QR generation for whole profile rosters.
+
+Reads profiles from a directory of JSON files, a JSONL file or stdin ("-")
+and writes one PNG per profile using a process pool. Results are streamed as
+JSONL on stdout and throughput is reported on stderr.
+
+    python batch_qr.py profiles.jsonl out_dir --workers 8
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import profile_codec
+import qr_chunks
+from qr_encode import DEFAULT_ENCODE_PROFILE, DEFAULT_PRINT_SIZE_MM, ENCODE_PROFILES, save_qr_png
+
+_UNSAFE_SLUG = re.compile(r"[^a-z0-9_-]+")
+
+
+class BatchStats:
+    """
+    Running counters for a batch run.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.done = 0
+        self.failed = 0
+        self.bytes_written = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, result):
+        self.done += 1
+        if result.get("error"):
+            self.failed += 1
+        else:
+            self.bytes_written += result.get("bytes", 0)
+
+    def summary(self):
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "bytes_written": self.bytes_written,
+            "elapsed_s": round(self.elapsed, 3),
+            "codes_per_s": round(self.rate, 1),
+        }
+
+
+def profile_slug(profile):
+    """
+    Filename-safe form of the profile's name: only [a-z0-9_-], "profile" when nothing is left.
+    """
+    name = str(profile.get("name", "")).strip() if isinstance(profile, dict) else ""
+    return _UNSAFE_SLUG.sub("_", name.lower()).strip("_") or "profile"
+
+
+def output_path(out_dir, filename):
+    """
+    `filename` joined to `out_dir`; raises ValueError if the result would land outside it.
+    """
+    path = os.path.join(out_dir, filename)
+    if os.path.dirname(os.path.realpath(path)) != os.path.realpath(out_dir):
+        raise ValueError(f"Output file {filename!r} is outside {out_dir}")
+    return path
+
+
+def iter_jobs(source):
+    """
+    Lazily yields (source_id, kind, raw) jobs from a directory, JSONL file or stdin.
+
+    Nothing is parsed here so the main process stays cheap and memory stays
+    bounded by the submission window, not the size of the input.
+    """
+    if source == "-":
+        for line_no, line in enumerate(sys.stdin, 1):
+            if line.strip():
+                yield f"{line_no:07d}", "json", line
+    elif os.path.isdir(source):
+        with os.scandir(source) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    yield os.path.splitext(entry.name)[0], "path", entry.path
+    else:
+        with open(source, "r") as jsonl_file:
+            for line_no, line in enumerate(jsonl_file, 1):
+                if line.strip():
+                    yield f"{line_no:07d}", "json", line
+
+
+def encode_job(source_id, kind, raw, out_dir, indent=None, compact=False, encode_profile=DEFAULT_ENCODE_PROFILE,
+               print_size_mm=DEFAULT_PRINT_SIZE_MM, chunk_max_version=None):
+    """
+    Worker entry point: parses one profile and writes its QR code PNG, or one PNG
+    per chunk ("paths") when `chunk_max_version` is set and the payload doesn't fit.
+    """
+    try:
+        if kind == "path":
+            with open(raw, "r") as json_file:
+                profile = json.load(json_file)
+            filename = f"{source_id}_qr.png"
+        else:
+            profile = json.loads(raw)
+            filename = f"{source_id}_{profile_slug(profile)}_qr.png"
+        payload = profile_codec.dumps(profile, compact, indent)
+        parts = qr_chunks.split(payload, chunk_max_version, encode_profile) if chunk_max_version else [payload]
+        paths = [
+            save_qr_png(part, output_path(out_dir, qr_chunks.part_filename(filename, index, len(parts))),
+                        encode_profile, print_size_mm)
+            for index, part in enumerate(parts, 1)
+        ]
+        result = {"source": source_id, "path": paths[0], "bytes": sum(os.path.getsize(path) for path in paths)}
+        if len(paths) > 1:
+            result["paths"] = paths
+        return result
+    except Exception as e:
+        return {"source": source_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def generate_batch(source, out_dir, workers=None, window=None, indent=None, stats=None, compact=False,
+                   encode_profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM, chunk_max_version=None):
+    """
+    Generates QR codes for every profile in `source` and yields one result per profile.
+
+    At most `window` jobs are in flight at any time (default: 4 per worker),
+    so memory use does not grow with the input. Results are yielded in
+    completion order.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * 4
+    stats = stats if stats is not None else BatchStats()
+    os.makedirs(out_dir, exist_ok=True)
+
+    jobs = ((*job, out_dir, indent, compact, encode_profile, print_size_mm, chunk_max_version)
+            for job in iter_jobs(source))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in bounded_map(pool, encode_job, jobs, window):
+            stats.update(result)
+            yield result
+
+
+def bounded_map(pool, func, jobs, window):
+    """
+    Like pool.map over an iterator of argument tuples, but with at most `window` jobs in flight.
+
+    Jobs are pulled lazily and results are yielded in completion order, so
+    memory stays bounded however long the input is.
+    """
+    jobs = iter(jobs)
+    pending = set()
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < window:
+            job = next(jobs, None)
+            if job is None:
+                exhausted = True
+                break
+            pending.add(pool.submit(func, *job))
+        if not pending:
+            return
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate QR code PNGs for a batch of profiles.")
+    parser.add_argument("source", help="Directory of *.json profiles, a JSONL file, or '-' for JSONL on stdin")
+    parser.add_argument("out_dir", help="Directory to write the PNG files to")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--window", type=int, default=None, help="Max jobs in flight (default: 4 per worker)")
+    parser.add_argument("--indent", type=int, default=None, help="JSON indent for the payload (app_beta.py uses 4)")
+    parser.add_argument("--compact", action="store_true", help="Use the compact profile payload format")
+    parser.add_argument("--encode-profile", choices=ENCODE_PROFILES, default=DEFAULT_ENCODE_PROFILE,
+                        help="throughput: pinned mask and precomputed version; robust: EC level for --print-size-mm")
+    parser.add_argument("--print-size-mm", type=float, default=DEFAULT_PRINT_SIZE_MM,
+                        help="Printed width of each code, used by --encode-profile robust")
+    parser.add_argument("--chunk-max-version", type=int, default=None,
+                        help="Split payloads that don't fit this QR version into a sequence of small codes")
+    parser.add_argument("--progress-every", type=float, default=2.0, help="Seconds between throughput reports")
+    args = parser.parse_args(argv)
+
+    stats = BatchStats()
+    last_report = time.perf_counter()
+    for result in generate_batch(args.source, args.out_dir, args.workers, args.window, args.indent, stats, args.compact,
+                                 args.encode_profile, args.print_size_mm, args.chunk_max_version):
+        sys.stdout.write(json.dumps(result) + "\n")
+        if time.perf_counter() - last_report >= args.progress_every:
+            last_report = time.perf_counter()
+            print(f"{stats.done} codes, {stats.rate:.1f} codes/s", file=sys.stderr)
+    print(json.dumps(stats.summary()), file=sys.stderr)
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,475 @@
+"""
+Reproducible benchmarks for the hot paths: QR generation, upload decoding,
+profile similarity and the live scan loop.
+
+Results are written as JSON; `compare` flags cases that got slower than a
+tolerance between two runs (and exits non-zero so CI can gate on it).
+
+    python benchmarks.py run --output bench.json
+    python benchmarks.py run --suites encode,similarity --repeat 3
+    python benchmarks.py compare baseline.json bench.json --tolerance 0.15
+    python benchmarks.py check-imports --budget-ms 150
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+SUITES = ("encode", "render", "decode", "similarity", "scan", "imports")
+
+# Case parameters; sizes are kept small enough for a laptop run of a few minutes
+ENCODE_PAYLOAD_SIZES = (32, 128, 512, 1024)
+ENCODE_LEVELS = ("L", "M", "Q", "H")
+DECODE_RESOLUTIONS = (640, 1280, 2560, 4000)
+DECODE_NOISE = (0, 10, 25)
+SIMILARITY_SIZES = (10, 100, 1000)
+SCAN_VIDEOS = (("vga_moving", 640, 480, 90), ("hd_moving", 1280, 720, 90))
+APP_MODULES = ("app", "app_beta", "demo")
+# Dependencies that only specific tabs need; none may load when an app module is imported
+HEAVY_MODULES = ("numpy", "scipy", "cv2", "sklearn", "pyzbar")
+DEFAULT_IMPORT_BUDGET_MS = 150.0
+
+# Runs in a fresh interpreter: Streamlit itself is excluded, then the app import and first generated code
+_IMPORT_PROBE = """
+import json, sys, time
+import streamlit
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+heavy = [name for name in {heavy!r} if name in sys.modules]
+import profile_codec
+from qr_encode import qr_png_bytes
+qr_png_bytes(profile_codec.dumps({{"name": "Sreelesh", "hobbies": ["reading", "traveling"]}}))
+generated = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - started) * 1000, "first_generate_ms": (generated - imported) * 1000,
+                  "heavy_modules": heavy}}))
+"""
+
+
+def measure(func, repeat=5, warmup=1):
+    """
+    Runs func() `warmup` + `repeat` times and returns timing stats in milliseconds
+    plus the last return value.
+    """
+    result = None
+    for _ in range(warmup):
+        result = func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3)}, result
+
+
+def available_decoders():
+    """
+    {name: decode(image)} for the decoder backends usable here (pyzbar needs the zbar shared library).
+    """
+    from decoders import available_backends
+
+    return available_backends()
+
+
+def payload(size, seed=0):
+    """
+    Profile-like JSON text of roughly `size` bytes.
+    """
+    rng = random.Random(seed)
+    words = ["reading", "traveling", "spicy", "savory", "programming", "coffee", "hiking", "music"]
+    profile = {"name": "Sreelesh", "email": "aikunnath@example.com", "hobbies": []}
+    while len(json.dumps(profile)) < size:
+        profile["hobbies"].append(rng.choice(words))
+    return json.dumps(profile)[:size]
+
+
+def bench_encode(repeat):
+    """
+    generate_qr_code (build matrix, render PNG) across payload sizes and EC levels,
+    plus the throughput and robust encode profiles.
+    """
+    import qrcode
+
+    from qr_encode import build_qr, qr_params, qr_png_bytes
+    from qr_render import png_bytes
+
+    levels = {
+        "L": qrcode.constants.ERROR_CORRECT_L,
+        "M": qrcode.constants.ERROR_CORRECT_M,
+        "Q": qrcode.constants.ERROR_CORRECT_Q,
+        "H": qrcode.constants.ERROR_CORRECT_H,
+    }
+    rows = []
+    for size in ENCODE_PAYLOAD_SIZES:
+        data = payload(size)
+        for level in ENCODE_LEVELS:
+            params = dict(qr_params(), error_correction=levels[level])
+
+            def generate():
+                qr = qrcode.QRCode(**params)
+                qr.add_data(data)
+                qr.make(fit=True)
+                png_bytes(qr.get_matrix(), params["box_size"])
+                return qr.version
+
+            case = f"generate_qr_code/bytes={size}/ec={level}"
+            try:
+                timing, version = measure(generate, repeat)
+            except qrcode.exceptions.DataOverflowError:
+                rows.append({"suite": "encode", "case": case, "skipped": "payload too large for this EC level"})
+                continue
+            rows.append(dict({"suite": "encode", "case": case, "qr_version": version}, **timing))
+        for profile in ("throughput", "robust"):
+            timing, _ = measure(lambda: qr_png_bytes(data, profile), repeat)
+            qr = build_qr(data, profile)
+            rows.append(dict({"suite": "encode", "case": f"generate_qr_code/bytes={size}/profile={profile}",
+                              "qr_version": qr.version, "error_correction": qr.error_correction}, **timing))
+    return rows
+
+
+def bench_render(repeat):
+    """
+    Rendering a finished matrix: PIL make_image + save against qr_render's PNG and SVG paths.
+    """
+    import numpy as np
+    from PIL import Image
+
+    from qr_encode import QR_BOX_SIZE, build_qr
+    from qr_render import png_bytes, svg_text
+
+    rows = []
+    for size in ENCODE_PAYLOAD_SIZES:
+        qr = build_qr(payload(size))
+        matrix = qr.get_matrix()
+
+        def pil_png():
+            buffered = BytesIO()
+            qr.make_image(fill_color="black", back_color="white").save(buffered, format="PNG")
+            return buffered.getvalue()
+
+        pil_timing, reference = measure(pil_png, repeat)
+        fast_timing, fast = measure(lambda: png_bytes(matrix, QR_BOX_SIZE), repeat)
+        svg_timing, _ = measure(lambda: svg_text(matrix, QR_BOX_SIZE), repeat)
+        identical = np.array_equal(np.asarray(Image.open(BytesIO(reference))), np.asarray(Image.open(BytesIO(fast))))
+        base = {"suite": "render", "qr_version": qr.version}
+        rows.append(dict(base, case=f"pil_png/bytes={size}", png_bytes=len(reference), **pil_timing))
+        rows.append(dict(base, case=f"numpy_png/bytes={size}", png_bytes=len(fast), pixel_identical=identical,
+                         speedup=round(pil_timing["median_ms"] / fast_timing["median_ms"], 2), **fast_timing))
+        rows.append(dict(base, case=f"svg/bytes={size}", **svg_timing))
+    return rows
+
+
+def synthetic_photo(data, longest_side, noise, seed=0):
+    """
+    JPEG bytes of a QR code placed off-centre on a grey page, with Gaussian noise.
+    """
+    import numpy as np
+    from PIL import Image
+
+    from qr_encode import make_qr_image
+
+    width, height = longest_side, longest_side * 3 // 4
+    page = Image.new("L", (width, height), 200)
+    code = make_qr_image(data).convert("L")
+    side = max(64, min(width, height) // 3)
+    page.paste(code.resize((side, side), Image.NEAREST), (width // 3, height // 4))
+    pixels = np.asarray(page, dtype=np.float32)
+    if noise:
+        pixels = pixels + np.random.RandomState(seed).normal(0, noise, pixels.shape)
+    buffered = BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffered, format="JPEG", quality=90)
+    return buffered.getvalue()
+
+
+def bench_decode(repeat):
+    """
+    decode_qr_code (the preprocessing ladder, uncached) across resolutions and noise levels.
+    """
+    from decode_ladder import DecodeLadder
+
+    data = payload(256)
+    rows = []
+    for decoder_name, decoder in available_decoders().items():
+        for resolution in DECODE_RESOLUTIONS:
+            for noise in DECODE_NOISE:
+                raw = synthetic_photo(data, resolution, noise)
+                ladder = DecodeLadder(decoder=decoder, cache_size=0)
+                timing, result = measure(lambda: ladder.decode(raw), repeat)
+                decoded = bool(result.symbols) and result.symbols[0].data.decode("utf-8") == data
+                rows.append(dict({
+                    "suite": "decode",
+                    "case": f"decode_qr_code/{decoder_name}/px={resolution}/noise={noise}",
+                    "decoded": decoded,
+                    "stage": result.stage,
+                }, **timing))
+    return rows
+
+
+def bench_similarity(repeat):
+    """
+    calculate_similarity vs compare_profiles_ai (cold vectorizer and warm cache) across list sizes.
+    """
+    from profile_vectors import ProfileVectorizer
+    from similarity import profile_similarity, synthetic_profile
+
+    rng = random.Random(0)
+    warm = ProfileVectorizer()
+    rows = []
+    for size in SIMILARITY_SIZES:
+        profile1 = synthetic_profile(size, rng)
+        profile2 = synthetic_profile(size, rng)
+        cases = (
+            ("calculate_similarity", lambda: profile_similarity(profile1, profile2)),
+            ("compare_profiles_ai_cold",
+             lambda: ProfileVectorizer().similarity_matrix([profile1], [profile2])[0][0]),
+            ("compare_profiles_ai_warm", lambda: warm.similarity_matrix([profile1], [profile2])[0][0]),
+        )
+        for name, func in cases:
+            timing, score = measure(func, repeat)
+            rows.append(dict({"suite": "similarity", "case": f"{name}/list_size={size}", "score": round(float(score), 3)},
+                             **timing))
+    return rows
+
+
+def write_synthetic_video(path, width, height, frames, data):
+    """
+    MJPG video of a QR code sliding across the frame, absent from every fourth second.
+    """
+    import cv2
+    import numpy as np
+
+    from qr_encode import make_qr_image
+
+    fps = 30
+    side = min(width, height) // 2
+    code = np.asarray(make_qr_image(data).convert("L").resize((side, side)), dtype=np.uint8)
+    code = cv2.cvtColor(code, cv2.COLOR_GRAY2BGR)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    try:
+        for index in range(frames):
+            frame = np.full((height, width, 3), 180, dtype=np.uint8)
+            if (index // fps) % 4 != 3:
+                x = int((width - side) * (index % fps) / fps)
+                y = (height - side) // 2
+                frame[y:y + side, x:x + side] = code
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def replay_scan_loop(path, decoder):
+    """
+    scanqr.scan_loop without the window: newest frame, drain and reassemble results, draw overlays.
+    """
+    from scan_pipeline import RoiDecoder, ScanPipeline
+    from scanqr import scan_loop
+
+    started = time.perf_counter()
+    pipeline = ScanPipeline(path, decoder=RoiDecoder(decoder=decoder), realtime=False).start()
+    try:
+        counts = scan_loop(pipeline, show=False, on_payload=lambda payload: None)
+    finally:
+        pipeline.stop()
+    elapsed = time.perf_counter() - started
+    summary = pipeline.summary()
+    summary.update(counts)
+    summary["wall_ms"] = round(elapsed * 1000, 3)
+    return summary
+
+
+def bench_scan(repeat):
+    """
+    Replays the live scan loop on synthetic videos as fast as they can be read.
+    """
+    data = payload(128)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, width, height, frames in SCAN_VIDEOS:
+            path = write_synthetic_video(os.path.join(tmp, f"{name}.avi"), width, height, frames, data)
+            for decoder_name, decoder in available_decoders().items():
+                timing, summary = measure(lambda: replay_scan_loop(path, decoder), repeat, warmup=0)
+                row = {"suite": "scan", "case": f"scan_loop/{decoder_name}/{name}", "frames": frames}
+                for key in ("decoded_frames", "results", "payloads", "dropped_frames", "latency_p50_ms",
+                            "latency_p95_ms", "roi_hits", "rescans"):
+                    row[key] = summary.get(key)
+                row["frames_per_s"] = round(frames / (timing["median_ms"] / 1000), 1)
+                rows.append(dict(row, **timing))
+    return rows
+
+
+def probe_app_import(module):
+    """
+    Cold import of one app module in a fresh interpreter (Streamlit already loaded).
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        env=dict(os.environ, QRDNA_WARMUP="0"),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_imports(repeat):
+    """
+    Cold start of each app: module import and the first generated QR code.
+    """
+    rows = []
+    for module in APP_MODULES:
+        samples = [probe_app_import(module) for _ in range(repeat)]
+        imports = [sample["import_ms"] for sample in samples]
+        rows.append({
+            "suite": "imports",
+            "case": f"cold_import/{module}",
+            "median_ms": round(statistics.median(imports), 3),
+            "min_ms": round(min(imports), 3),
+            "first_generate_ms": round(statistics.median(sample["first_generate_ms"] for sample in samples), 3),
+            "heavy_modules": samples[-1]["heavy_modules"],
+        })
+    return rows
+
+
+def check_imports(budget_ms=DEFAULT_IMPORT_BUDGET_MS, repeat=3):
+    """
+    Import-time budget: each app must import within `budget_ms` (median) without heavy modules.
+    Returns (rows, failures).
+    """
+    rows = bench_imports(repeat)
+    failures = []
+    for row in rows:
+        if row["median_ms"] > budget_ms:
+            failures.append(f"{row['case']} took {row['median_ms']:.1f} ms (budget {budget_ms:.0f} ms)")
+        if row["heavy_modules"]:
+            failures.append(f"{row['case']} loaded {', '.join(row['heavy_modules'])} at import")
+    return rows, failures
+
+
+BENCHMARKS = {
+    "encode": bench_encode,
+    "render": bench_render,
+    "decode": bench_decode,
+    "similarity": bench_similarity,
+    "scan": bench_scan,
+    "imports": bench_imports,
+}
+
+
+def environment():
+    versions = {}
+    for module in ("qrcode", "PIL", "cv2", "numpy", "scipy"):
+        try:
+            versions[module] = getattr(__import__(module), "__version__", "unknown")
+        except ImportError:
+            versions[module] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "versions": versions,
+    }
+
+
+def run(suites=SUITES, repeat=5):
+    report = {"environment": environment(), "repeat": repeat, "results": []}
+    for suite in suites:
+        started = time.perf_counter()
+        report["results"] += BENCHMARKS[suite](repeat)
+        print(f"{suite}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return report
+
+
+def compare(baseline, current, tolerance=0.10, min_delta_ms=0.05):
+    """
+    Matches cases by (suite, case) and returns rows for every changed case.
+
+    A case regresses when its median grows by more than `tolerance` (relative)
+    and `min_delta_ms` (absolute, to ignore noise on sub-millisecond cases),
+    or when a decode that used to succeed now fails.
+    """
+    before = {(row["suite"], row["case"]): row for row in baseline["results"]}
+    rows = []
+    for row in current["results"]:
+        old = before.get((row["suite"], row["case"]))
+        if old is None or "median_ms" not in row or "median_ms" not in old:
+            continue
+        ratio = row["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        delta = row["median_ms"] - old["median_ms"]
+        status = "ok"
+        if ratio > 1 + tolerance and delta > min_delta_ms:
+            status = "regression"
+        elif ratio < 1 - tolerance and -delta > min_delta_ms:
+            status = "improvement"
+        if old.get("decoded") and not row.get("decoded", True):
+            status = "regression"
+        rows.append({
+            "suite": row["suite"],
+            "case": row["case"],
+            "baseline_ms": old["median_ms"],
+            "current_ms": row["median_ms"],
+            "ratio": round(ratio, 3),
+            "status": status,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark QR generation, decoding, similarity and scanning.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run benchmarks and write JSON results")
+    run_parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per case")
+    run_parser.add_argument("--output", "-o", help="Results file (default: stdout)")
+    compare_parser = commands.add_parser("compare", help="Compare two result files and flag regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown")
+    compare_parser.add_argument("--all", action="store_true", help="Also print unchanged cases")
+    imports_parser = commands.add_parser("check-imports", help="Fail if an app imports slowly or loads heavy modules")
+    imports_parser.add_argument("--budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                                help="Median import-time budget per app, excluding Streamlit itself")
+    imports_parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per app")
+    args = parser.parse_args(argv)
+
+    if args.command == "check-imports":
+        rows, failures = check_imports(args.budget_ms, args.repeat)
+        for row in rows:
+            print(json.dumps(row))
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        return 1 if failures else 0
+
+    if args.command == "run":
+        suites = [suite.strip() for suite in args.suites.split(",") if suite.strip()]
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+        report = run(suites, args.repeat)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as output_file:
+                output_file.write(text + "\n")
+        else:
+            print(text)
+        return 0
+
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        rows = compare(json.load(baseline_file), json.load(current_file), args.tolerance)
+    for row in rows:
+        if args.all or row["status"] != "ok":
+            print(f"{row['status']:<12} {row['ratio']:>6.2f}x  {row['baseline_ms']:>10.3f} -> "
+                  f"{row['current_ms']:>10.3f} ms  {row['suite']}/{row['case']}")
+    regressions = sum(row["status"] == "regression" for row in rows)
+    print(f"{len(rows)} cases compared, {regressions} regressions", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
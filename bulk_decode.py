@@ -0,0 +1,132 @@
+"""
+Bulk decoding of QR images: every symbol in every image, streamed as JSONL.
+
+Accepts directories (searched recursively), ZIP archives and individual
+image files. Images are decoded in a process pool with a bounded number of
+jobs in flight, so tens of thousands of scanned forms run in constant memory.
+
+    python bulk_decode.py scans/ forms.zip extra.png > decoded.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import profile_codec
+from batch_qr import bounded_map
+from decoders import get_default_decoder
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+
+
+def symbol_to_dict(obj):
+    data = obj.data.decode("utf-8", errors="replace")
+    try:
+        data = profile_codec.to_json_text(data)
+    except ValueError:
+        pass
+    return {
+        "data": data,
+        "type": obj.type,
+        "rect": {"left": obj.rect.left, "top": obj.rect.top, "width": obj.rect.width, "height": obj.rect.height},
+        "polygon": [[p.x, p.y] for p in obj.polygon],
+    }
+
+
+def decode_all_symbols(image):
+    """
+    Decodes every symbol in a PIL image, unlike decode_qr_code which keeps only the first.
+    """
+    return [symbol_to_dict(obj) for obj in get_default_decoder()(image)]
+
+
+def decode_job(source, kind, payload):
+    """
+    Worker entry point: opens one image (path or bytes) and decodes all symbols in it.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(payload if kind == "path" else BytesIO(payload))
+        return {"source": source, "symbols": decode_all_symbols(image)}
+    except Exception as e:
+        return {"source": source, "symbols": [], "error": f"{type(e).__name__}: {e}"}
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_jobs(inputs):
+    """
+    Lazily yields (source, kind, payload) jobs for directories, ZIP files, image paths
+    and file-like uploads (objects with .name and .read()).
+    """
+    for item in inputs:
+        if hasattr(item, "read"):
+            name = getattr(item, "name", "upload")
+            if name.lower().endswith(".zip"):
+                yield from iter_zip_jobs(item, name)
+            else:
+                yield name, "bytes", item.read()
+        elif os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for filename in files:
+                    if is_image_name(filename):
+                        yield os.path.join(root, filename), "path", os.path.join(root, filename)
+        elif zipfile.is_zipfile(item):
+            yield from iter_zip_jobs(item, item)
+        else:
+            yield item, "path", item
+
+
+def iter_zip_jobs(archive, label):
+    with zipfile.ZipFile(archive) as zip_file:
+        for info in zip_file.infolist():
+            if not info.is_dir() and is_image_name(info.filename):
+                yield f"{label}:{info.filename}", "bytes", zip_file.read(info)
+
+
+def decode_batch(inputs, workers=None, window=None):
+    """
+    Decodes every image in `inputs` and yields one result per image in completion order.
+
+    Each result is {"source", "symbols": [{"data", "type", "rect", "polygon"}], "error"?}.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from bounded_map(pool, decode_job, iter_jobs(inputs), window)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode every QR code in a batch of images.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or ZIP archives")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--window", type=int, default=None, help="Max images in flight (default: 4 per worker)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    images = symbols = failed = 0
+    for result in decode_batch(args.inputs, args.workers, args.window):
+        sys.stdout.write(json.dumps(result) + "\n")
+        images += 1
+        symbols += len(result["symbols"])
+        failed += "error" in result
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "images": images,
+        "symbols": symbols,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "images_per_s": round(images / elapsed, 1) if elapsed else 0.0,
+    }), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Preprocessing ladder for decoding large photo uploads.
+
+Phone photos are decoded with the cheapest pass first: a downscaled
+grayscale image (JPEGs are decoded at reduced size directly). Only when a
+pass finds nothing does the ladder step up to sharper resolutions and then
+to binarized (Otsu, adaptive threshold) variants, stopping at the first
+success. Results are memoized by file hash so Streamlit reruns are free.
+
+    python decode_ladder.py photo1.jpg photo2.jpg
+"""
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from io import BytesIO
+
+from decoders import get_default_decoder
+from instrumentation import stage
+from scan_pipeline import percentile, transform_symbol
+
+LadderResult = namedtuple("LadderResult", ["symbols", "stage", "cached"])
+
+# (stage name, longest side in pixels or None for full resolution, binarization)
+DEFAULT_STAGES = (
+    ("gray_1024", 1024, None),
+    ("gray_2048", 2048, None),
+    ("gray_full", None, None),
+    ("otsu_2048", 2048, "otsu"),
+    ("adaptive_2048", 2048, "adaptive"),
+)
+
+
+class LadderStats:
+    """
+    Per-stage attempts, successes and latency, plus memo hit rate.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self.stages = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, stage, latency, success):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"attempts": 0, "successes": 0, "latencies": deque(maxlen=self.window)})
+            entry["attempts"] += 1
+            entry["successes"] += success
+            entry["latencies"].append(latency)
+
+    def summary(self):
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "cache_hit_rate": round(self.cache_hits / lookups, 3) if lookups else 0.0,
+                "stages": {
+                    stage: {
+                        "attempts": entry["attempts"],
+                        "successes": entry["successes"],
+                        "hit_rate": round(entry["successes"] / entry["attempts"], 3),
+                        "latency_p50_ms": round(percentile(list(entry["latencies"]), 50) * 1000, 2),
+                        "latency_p95_ms": round(percentile(list(entry["latencies"]), 95) * 1000, 2),
+                    }
+                    for stage, entry in self.stages.items()
+                },
+            }
+
+
+def _read_bytes(file):
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    if isinstance(file, str):
+        with open(file, "rb") as image_file:
+            return image_file.read()
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    position = file.tell()
+    data = file.read()
+    file.seek(position)
+    return data
+
+
+def _load_gray(raw, longest_side):
+    """
+    Opens the image as grayscale, at most `longest_side` pixels on its longest side.
+
+    Returns (image, scale) where scale maps image coordinates back to the original.
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(raw))
+    width, height = image.size
+    if longest_side and max(width, height) > longest_side:
+        factor = longest_side / max(width, height)
+        target = (max(1, int(width * factor)), max(1, int(height * factor)))
+        image.draft("L", target)
+        image = image.convert("L")
+        if max(image.size) > longest_side:
+            image.thumbnail((longest_side, longest_side))
+    else:
+        image = image.convert("L")
+    return image, width / image.size[0]
+
+
+def _binarize(image, method):
+    import cv2
+    import numpy as np
+
+    gray = np.asarray(image)
+    if method == "otsu":
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    else:
+        binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 5)
+    return binary
+
+
+class DecodeLadder:
+    """
+    Tries `stages` in order and stops at the first one that decodes anything.
+    """
+
+    def __init__(self, stages=DEFAULT_STAGES, decoder=None, cache_size=128):
+        self.stages = stages
+        self.decoder = decoder or get_default_decoder()
+        self.cache_size = cache_size
+        self.stats = LadderStats()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, file):
+        """
+        Decodes an image path, bytes or file-like upload and returns a LadderResult.
+        """
+        raw = _read_bytes(file)
+        key = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats.cache_hits += 1
+                return cached._replace(cached=True)
+            self.stats.cache_misses += 1
+
+        result = self._run(raw)
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _run(self, raw):
+        tried = set()
+        loaded = {}
+        for stage_name, longest_side, binarization in self.stages:
+            started = time.perf_counter()
+            if longest_side not in loaded:
+                with stage("image.load"):
+                    loaded[longest_side] = _load_gray(raw, longest_side)
+            image, scale = loaded[longest_side]
+            # A smaller image than the stage asks for makes repeated gray passes pointless
+            signature = (image.size, binarization)
+            if signature in tried:
+                continue
+            tried.add(signature)
+
+            pixels = _binarize(image, binarization) if binarization else image
+            symbols = [transform_symbol(obj, scale) for obj in self.decoder(pixels)]
+            self.stats.record(stage_name, time.perf_counter() - started, bool(symbols))
+            if symbols:
+                return LadderResult(symbols, stage_name, False)
+        return LadderResult([], None, False)
+
+
+_default_ladder = None
+_default_lock = threading.Lock()
+
+
+def get_default_ladder():
+    """
+    Process-wide ladder so memoized results and stats are shared across Streamlit reruns.
+    """
+    global _default_ladder
+    with _default_lock:
+        if _default_ladder is None:
+            _default_ladder = DecodeLadder()
+        return _default_ladder
+
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print("usage: python decode_ladder.py IMAGE [...]", file=sys.stderr)
+        return 2
+    ladder = get_default_ladder()
+    for path in paths:
+        result = ladder.decode(path)
+        data = [obj.data.decode("utf-8", errors="replace") for obj in result.symbols]
+        print(json.dumps({"source": path, "stage": result.stage, "data": data}))
+    print(json.dumps(ladder.stats.summary()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+QR decoder backends and the fallback chain the apps decode through.
+
+Two backends are available: pyzbar (needs the zbar shared library) and
+OpenCV's QRCodeDetector (multi-detect, ships with opencv-python). Each one
+takes a PIL image or NumPy array and returns pyzbar-shaped symbols (.data,
+.type, .rect, .polygon). A chain tries its backends in order and stops at
+the first one that finds anything; backends that can't load here are
+skipped.
+
+The chain comes from QRDNA_DECODERS, or else from the chain saved by the
+last calibration (saved_data/decoders.json), or else "pyzbar,opencv".
+`calibrate` times every backend on a sample set, puts the fastest one that
+reaches the target success rate first and saves that order, so the apps
+pick it up on their next start:
+
+    python decoders.py calibrate scans/ --synthetic 24 --target 0.95
+    QRDNA_DECODERS=opencv,pyzbar streamlit run app.py   # overrides the saved chain
+    python decoders.py decode photo.jpg
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from instrumentation import stage
+from qr_encode import SAVE_DIR
+
+# Same shape as pyzbar's Decoded/Point/Rect so callers can use either
+Point = namedtuple("Point", ["x", "y"])
+Rect = namedtuple("Rect", ["left", "top", "width", "height"])
+Symbol = namedtuple("Symbol", ["data", "type", "rect", "polygon"])
+
+DEFAULT_CHAIN = ("pyzbar", "opencv")
+DECODER_CONFIG = os.path.join(SAVE_DIR, "decoders.json")
+DEFAULT_TARGET_SUCCESS = 0.95
+
+
+class PyzbarDecoder:
+    """
+    zbar through pyzbar; fast on clean codes and reads 1D barcodes too.
+    """
+
+    name = "pyzbar"
+
+    def __init__(self):
+        self._decode = None
+
+    def available(self):
+        try:
+            self._load()
+        except (ImportError, OSError):
+            return False
+        return True
+
+    def _load(self):
+        if self._decode is None:
+            from pyzbar.pyzbar import decode
+            self._decode = decode
+        return self._decode
+
+    def __call__(self, image):
+        decode = self._load()
+        with stage("pyzbar.decode"):
+            return decode(image)
+
+
+class OpenCVDecoder:
+    """
+    cv2.QRCodeDetector.detectAndDecodeMulti; finds several codes per image.
+
+    Detectors aren't thread-safe, so each thread gets its own.
+    """
+
+    name = "opencv"
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def available(self):
+        try:
+            import cv2
+        except ImportError:
+            return False
+        return hasattr(cv2, "QRCodeDetector")
+
+    def _pixels(self, image):
+        import numpy as np
+
+        if hasattr(image, "mode") and image.mode not in ("L", "RGB"):
+            image = image.convert("L")
+        pixels = np.asarray(image)
+        if pixels.dtype == bool:
+            pixels = pixels.astype(np.uint8) * 255
+        return pixels
+
+    def __call__(self, image):
+        import cv2
+
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self._local.detector = cv2.QRCodeDetector()
+        with stage("opencv.decode"):
+            ok, texts, points, _ = detector.detectAndDecodeMulti(self._pixels(image))
+        if not ok:
+            return []
+        symbols = []
+        for text, corners in zip(texts, points):
+            if not text:
+                continue
+            polygon = [Point(int(x), int(y)) for x, y in corners]
+            xs, ys = [p.x for p in polygon], [p.y for p in polygon]
+            rect = Rect(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+            symbols.append(Symbol(text.encode("utf-8"), "QRCODE", rect, polygon))
+        return symbols
+
+
+BACKENDS = OrderedDict((
+    (PyzbarDecoder.name, PyzbarDecoder),
+    (OpenCVDecoder.name, OpenCVDecoder),
+))
+
+
+class DecoderChain:
+    """
+    Tries each backend in order until one returns symbols.
+
+    Availability is checked on first use, so building a chain imports
+    nothing. Per-backend attempts and successes are counted.
+    """
+
+    def __init__(self, names=DEFAULT_CHAIN):
+        unknown = [name for name in names if name not in BACKENDS]
+        if unknown:
+            raise ValueError(f"Unknown decoder(s) {', '.join(unknown)}; expected {', '.join(BACKENDS)}")
+        self.names = tuple(names)
+        self.stats = OrderedDict((name, {"attempts": 0, "successes": 0}) for name in self.names)
+        self._backends = None
+        self._lock = threading.Lock()
+
+    @property
+    def backends(self):
+        with self._lock:
+            if self._backends is None:
+                candidates = [BACKENDS[name]() for name in self.names]
+                self._backends = [backend for backend in candidates if backend.available()]
+            return self._backends
+
+    def __call__(self, image):
+        backends = self.backends
+        if not backends:
+            raise RuntimeError(f"No QR decoder available (tried {', '.join(self.names)})")
+        for backend in backends:
+            symbols = backend(image)
+            entry = self.stats[backend.name]
+            entry["attempts"] += 1
+            if symbols:
+                entry["successes"] += 1
+                return symbols
+        return []
+
+
+def chain_from_env():
+    """
+    Backend names from QRDNA_DECODERS ("pyzbar,opencv" style), or DEFAULT_CHAIN.
+    """
+    value = os.environ.get("QRDNA_DECODERS", "")
+    names = tuple(name.strip().lower() for name in value.split(",") if name.strip())
+    return names or DEFAULT_CHAIN
+
+
+def save_chain(chain, rows=None, path=DECODER_CONFIG):
+    """
+    Saves a calibrated chain (with its calibration rows) for load_chain.
+
+    Backends that couldn't be calibrated here are appended, so they are
+    still tried if they become available later.
+    """
+    chain = tuple(chain) + tuple(name for name in BACKENDS if name not in chain)
+    config = {"chain": list(chain), "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "calibration": rows or []}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as config_file:
+        json.dump(config, config_file, indent=4)
+    os.replace(tmp_path, path)
+    return chain
+
+
+def load_chain(path=DECODER_CONFIG):
+    """
+    The chain saved by the last calibration, or None if there is no usable one.
+    """
+    try:
+        with open(path, "r") as config_file:
+            config = json.load(config_file)
+    except (OSError, ValueError):
+        return None
+    names = config.get("chain") if isinstance(config, dict) else None
+    if not isinstance(names, list):
+        return None
+    return tuple(name for name in names if name in BACKENDS) or None
+
+
+def configured_chain(path=DECODER_CONFIG):
+    """
+    QRDNA_DECODERS if set, else the saved calibration, else DEFAULT_CHAIN.
+    """
+    if os.environ.get("QRDNA_DECODERS", "").strip():
+        return chain_from_env()
+    return load_chain(path) or DEFAULT_CHAIN
+
+
+def available_backends(names=None):
+    """
+    {name: backend} for the backends that load here, in `names` order (default: all).
+    """
+    backends = OrderedDict()
+    for name in names or BACKENDS:
+        backend = BACKENDS[name]()
+        if backend.available():
+            backends[name] = backend
+    return backends
+
+
+_default_decoder = None
+_default_lock = threading.Lock()
+
+
+def get_default_decoder():
+    """
+    Process-wide chain from configured_chain(): QRDNA_DECODERS, the saved calibration or the default.
+    """
+    global _default_decoder
+    with _default_lock:
+        if _default_decoder is None:
+            _default_decoder = DecoderChain(configured_chain())
+        return _default_decoder
+
+
+def _decoded(symbols, expected):
+    if expected is None:
+        return bool(symbols)
+    return any(obj.data == expected for obj in symbols)
+
+
+def calibrate(samples, target_success=DEFAULT_TARGET_SUCCESS, names=None, repeat=1):
+    """
+    Benchmarks each available backend on `samples` and orders them for a chain.
+
+    `samples` is a list of images or (image, expected_bytes) pairs; without
+    an expected payload any decoded symbol counts as a success. Returns
+    (chain, rows): the fastest backend reaching `target_success` first (or
+    the most successful one if none does), then the rest by success rate.
+    """
+    samples = [sample if isinstance(sample, tuple) else (sample, None) for sample in samples]
+    rows = []
+    for name, backend in available_backends(names).items():
+        successes = 0
+        timings = []
+        for image, expected in samples:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                symbols = backend(image)
+                timings.append((time.perf_counter() - started) * 1000)
+            successes += _decoded(symbols, expected)
+        rows.append({
+            "decoder": name,
+            "samples": len(samples),
+            "success_rate": round(successes / len(samples), 3) if samples else 0.0,
+            "median_ms": round(statistics.median(timings), 3) if timings else 0.0,
+            "mean_ms": round(statistics.mean(timings), 3) if timings else 0.0,
+        })
+    qualified = sorted((row for row in rows if row["success_rate"] >= target_success), key=lambda row: row["median_ms"])
+    rest = sorted((row for row in rows if row not in qualified),
+                  key=lambda row: (-row["success_rate"], row["median_ms"]))
+    return tuple(row["decoder"] for row in qualified + rest), rows
+
+
+def load_samples(inputs, synthetic=0):
+    """
+    Grayscale PIL images from image files, directories or ZIPs, plus `synthetic`
+    generated photos (with known payloads) across sizes and noise levels.
+    """
+    from io import BytesIO
+
+    from PIL import Image
+
+    from bulk_decode import iter_jobs
+
+    samples = []
+    for source, kind, payload in iter_jobs(inputs):
+        try:
+            samples.append(Image.open(payload if kind == "path" else BytesIO(payload)).convert("L"))
+        except Exception as e:
+            print(f"skipping {source}: {type(e).__name__}: {e}", file=sys.stderr)
+    if synthetic:
+        from benchmarks import DECODE_NOISE, DECODE_RESOLUTIONS, payload, synthetic_photo
+
+        for index in range(synthetic):
+            data = payload(64 + 32 * (index % 8), seed=index)
+            resolution = DECODE_RESOLUTIONS[index % len(DECODE_RESOLUTIONS)]
+            noise = DECODE_NOISE[(index // len(DECODE_RESOLUTIONS)) % len(DECODE_NOISE)]
+            raw = synthetic_photo(data, resolution, noise, seed=index)
+            samples.append((Image.open(BytesIO(raw)).convert("L"), data.encode("utf-8")))
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QR decoder backends: calibration and one-off decoding.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    calibrate_parser = subparsers.add_parser("calibrate", help="Benchmark the backends and suggest a chain")
+    calibrate_parser.add_argument("inputs", nargs="*", help="Sample images, directories or ZIP archives")
+    calibrate_parser.add_argument("--synthetic", type=int, default=0, help="Also generate this many sample photos")
+    calibrate_parser.add_argument("--target", type=float, default=DEFAULT_TARGET_SUCCESS,
+                                  help="Success rate the chosen backend must reach")
+    calibrate_parser.add_argument("--repeat", type=int, default=1, help="Timed decodes per sample")
+    calibrate_parser.add_argument("--config", default=DECODER_CONFIG, help="Where to save the chosen chain")
+    calibrate_parser.add_argument("--no-save", action="store_true", help="Only print the chosen chain")
+
+    decode_parser = subparsers.add_parser("decode", help="Decode images with the configured chain")
+    decode_parser.add_argument("images", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "calibrate":
+        samples = load_samples(args.inputs, args.synthetic)
+        if not samples:
+            print("no samples: pass images or --synthetic N", file=sys.stderr)
+            return 2
+        chain, rows = calibrate(samples, args.target, repeat=args.repeat)
+        for row in rows:
+            print(json.dumps(row), file=sys.stderr)
+        if not chain:
+            print("no decoder backend is available", file=sys.stderr)
+            return 1
+        if not args.no_save:
+            chain = save_chain(chain, rows, args.config)
+            print(f"saved to {args.config}; the apps use it unless QRDNA_DECODERS is set", file=sys.stderr)
+        print(f"QRDNA_DECODERS={','.join(chain)}")
+        return 0
+
+    from PIL import Image
+
+    decoder = get_default_decoder()
+    for path in args.images:
+        symbols = decoder(Image.open(path).convert("L"))
+        print(json.dumps({"source": path, "data": [obj.data.decode("utf-8", errors="replace") for obj in symbols]}))
+    print(json.dumps(decoder.stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
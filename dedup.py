@@ -0,0 +1,280 @@
+"""
+Offline near-duplicate detection over the stored profile corpus.
+
+Each profile is reduced to a MinHash signature over its field tokens.
+LSH banding buckets signatures so that only profiles sharing a band become
+candidate pairs, and profiles sharing a normalized email or phone are
+paired as well. Candidates are confirmed with the exact comparator from
+similarity.py and merged into clusters. Identity pairs are scored on the
+fields both profiles fill in, so a sparse record still matches the full
+one it duplicates, while a shared family or office address alone is not
+enough when the names and other shared fields disagree. Every step is linear in the number
+of profiles apart from the (capped) candidate buckets.
+
+    python dedup.py saved_data/profiles.db --threshold 60
+    python dedup.py profiles.jsonl > clusters.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+
+from profile_index import iter_profile_files, profile_tokens
+from profile_store import STORE_PATH, ProfileStore
+from similarity import normalize_profile, normalized_similarity
+
+# Largest prime below 2**32 for the universal hash family: with a, b and x reduced below it,
+# a*x + b <= (p-1)**2 + (p-1) < 2**64 can't overflow uint64, and every hash fits in uint32
+_PRIME = np.uint64(4294967291)
+_IDENTITY_FIELDS = ("email", "phone")
+DEFAULT_IDENTITY_THRESHOLD = 50.0
+
+
+def token_hashes(tokens):
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little") for token in tokens],
+        dtype=np.uint64,
+    )
+
+
+class MinHasher:
+    """
+    MinHash signatures from `num_perm` hash functions h(x) = (a*x + b) mod p.
+
+    a, b and x are all kept below p, so the uint64 arithmetic is exact.
+    """
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.randint(0, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, tokens):
+        if not tokens:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        hashed = (self._a * (token_hashes(tokens) % _PRIME)[np.newaxis, :] + self._b) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+
+def _pairs_from_groups(order, group_keys, max_bucket, pairs):
+    """
+    Adds all pairs within runs of equal keys (in sorted order) to `pairs`.
+    """
+    if len(order) < 2:
+        return
+    boundaries = np.flatnonzero(group_keys[1:] != group_keys[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(order)]))
+    for start, end in zip(starts, ends):
+        size = end - start
+        if size < 2 or size > max_bucket:
+            continue
+        members = np.sort(order[start:end])
+        for i in range(size):
+            for j in range(i + 1, size):
+                pairs.add((int(members[i]), int(members[j])))
+
+
+def lsh_candidates(signatures, bands=32, max_bucket=200, skip=None):
+    """
+    Candidate pairs (i, j), i < j, whose signatures agree on at least one band.
+
+    Buckets larger than `max_bucket` (e.g. thousands of empty profiles) are
+    skipped to keep the job near-linear. Rows flagged in `skip` are ignored.
+    """
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    multipliers = np.random.RandomState(7).randint(1, 2 ** 62, size=rows, dtype=np.int64).astype(np.uint64)
+    active = np.arange(count) if skip is None else np.flatnonzero(~skip)
+    pairs = set()
+    for band in range(bands):
+        block = signatures[active, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = (block * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        _pairs_from_groups(active[order], keys[order], max_bucket, pairs)
+    return pairs
+
+
+def identity_candidates(identity_keys, max_bucket=200):
+    """
+    Candidate pairs of profiles sharing a normalized email or phone.
+    """
+    buckets = {}
+    for row, keys in enumerate(identity_keys):
+        for key in keys:
+            buckets.setdefault(key, []).append(row)
+    pairs = set()
+    for members in buckets.values():
+        if 2 <= len(members) <= max_bucket:
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+
+class UnionFind:
+    def __init__(self):
+        self._parent = {}
+
+    def find(self, item):
+        parent = self._parent.setdefault(item, item)
+        while parent != item:
+            grandparent = self._parent.setdefault(parent, parent)
+            self._parent[item] = grandparent
+            item, parent = parent, grandparent
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self._parent[root_b] = root_a
+
+    def groups(self):
+        groups = {}
+        for item in self._parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
+
+
+def iter_records(source):
+    """
+    Yields (key, profile) from a profile store (key = id), a directory of JSON files
+    or a JSONL file (key = byte offset).
+    """
+    if source.endswith(".db"):
+        with ProfileStore(source) as store:
+            yield from store.iter_profiles()
+        return
+    if os.path.isdir(source):
+        yield from iter_profile_files(source)
+        return
+    with open(source, "rb") as jsonl_file:
+        offset = 0
+        for line in jsonl_file:
+            if line.strip():
+                try:
+                    profile = json.loads(line)
+                except ValueError:
+                    profile = None
+                if isinstance(profile, dict):
+                    yield offset, profile
+            offset += len(line)
+
+
+@contextmanager
+def make_loader(source):
+    """
+    Context manager giving load(key) that re-reads one profile, so profiles need not stay in memory.
+    """
+    if source.endswith(".db"):
+        with ProfileStore(source) as store:
+            yield store.get
+        return
+    if os.path.isdir(source):
+        def load(key):
+            with open(key, "r") as json_file:
+                return json.load(json_file)
+        yield load
+        return
+
+    def load_line(offset):
+        with open(source, "rb") as jsonl_file:
+            jsonl_file.seek(offset)
+            return json.loads(jsonl_file.readline())
+    yield load_line
+
+
+def find_duplicates(records, load, threshold=60.0, num_perm=128, bands=32, identity=True, max_bucket=200,
+                    identity_threshold=DEFAULT_IDENTITY_THRESHOLD):
+    """
+    Clusters of probable duplicate profiles as lists of keys, plus run statistics.
+
+    `records` yields (key, profile); `load(key)` must return the profile again
+    for the confirmation step. A candidate pair is confirmed when its
+    profile_similarity reaches `threshold`; with `identity`, profiles sharing
+    an email or phone number are candidates too and are confirmed when their
+    similarity over the fields both fill in reaches `identity_threshold`.
+    """
+    started = time.perf_counter()
+    hasher = MinHasher(num_perm)
+    keys = []
+    signatures = []
+    identity_keys = []
+    empty = []
+    for key, profile in records:
+        tokens = list(profile_tokens(profile))
+        keys.append(key)
+        signatures.append(hasher.signature(tokens))
+        empty.append(not tokens)
+        normalized = normalize_profile(profile)
+        identity_keys.append([f"{field}={normalized[field]}" for field in _IDENTITY_FIELDS if field in normalized])
+    signed = time.perf_counter()
+
+    if not keys:
+        return [], {"profiles": 0}
+    signatures = np.vstack(signatures)
+    candidates = lsh_candidates(signatures, bands, max_bucket, skip=np.array(empty))
+    identity_pairs = identity_candidates(identity_keys, max_bucket) if identity else set()
+    candidates |= identity_pairs
+    bucketed = time.perf_counter()
+
+    # Pairs are visited in row order, so a small cache avoids most re-reads
+    @lru_cache(maxsize=4096)
+    def normalized(row):
+        return normalize_profile(load(keys[row]))
+
+    clusters = UnionFind()
+    confirmed = 0
+    for i, j in sorted(candidates):
+        if (i, j) in identity_pairs:
+            confirmed_pair = normalized_similarity(normalized(i), normalized(j), shared_only=True) >= identity_threshold
+        else:
+            confirmed_pair = normalized_similarity(normalized(i), normalized(j)) >= threshold
+        if confirmed_pair:
+            clusters.union(i, j)
+            confirmed += 1
+    finished = time.perf_counter()
+
+    stats = {
+        "profiles": len(keys),
+        "candidate_pairs": len(candidates),
+        "confirmed_pairs": confirmed,
+        "signature_s": round(signed - started, 3),
+        "lsh_s": round(bucketed - signed, 3),
+        "confirm_s": round(finished - bucketed, 3),
+    }
+    return [[keys[row] for row in members] for members in clusters.groups()], stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find clusters of near-duplicate profiles.")
+    parser.add_argument("source", nargs="?", default=STORE_PATH,
+                        help="Profile store (*.db), directory of *.json profiles or a JSONL file")
+    parser.add_argument("--threshold", type=float, default=60.0, help="Minimum profile_similarity to confirm a pair")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash permutations")
+    parser.add_argument("--bands", type=int, default=32, help="LSH bands (num-perm must be divisible by it)")
+    parser.add_argument("--no-identity", action="store_true", help="Do not pair profiles by shared email/phone")
+    parser.add_argument("--identity-threshold", type=float, default=DEFAULT_IDENTITY_THRESHOLD,
+                        help="Minimum similarity over shared fields to confirm a pair sharing an email or phone")
+    args = parser.parse_args(argv)
+
+    if args.num_perm % args.bands:
+        parser.error("--num-perm must be divisible by --bands")
+    with make_loader(args.source) as load:
+        clusters, stats = find_duplicates(iter_records(args.source), load, args.threshold, args.num_perm, args.bands,
+                                          not args.no_identity, identity_threshold=args.identity_threshold)
+    for cluster in clusters:
+        print(json.dumps({"size": len(cluster), "members": cluster}))
+    print(json.dumps(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,15 @@
 import streamlit as st
 import json
 import os
-import qrcode
-from pyzbar.pyzbar import decode
-from PIL import Image
+from qr_encode import DEFAULT_ENCODE_PROFILE, DEFAULT_PRINT_SIZE_MM, encode_profile_sidebar, save_qr_png
+import profile_codec
+import qr_chunks
+from qr_chunks import part_filename
+from decode_ladder import get_default_ladder
+from profile_store import get_default_store
+from profile_index import update_default_index
+from instrumentation import profiling_sidebar, stage
+from warmup import start_warmup
 
 
 # Directory to save files
@@ -11,60 +17,51 @@ SAVE_DIR = "saved_data"
 os.makedirs(SAVE_DIR, exist_ok=True)
 
 # Helper Functions
-def save_json_file(data, filename):
-    filepath = os.path.join(SAVE_DIR, filename)
-    with open(filepath, "w") as json_file:
-        json.dump(data, json_file, indent=4)
-    return filepath
-
-def generate_qr_code(data, filename):
-    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill="black", back_color="white")
+def save_profile(data):
+    try:
+        profile_id = get_default_store().insert(data)
+    except ValueError as e:
+        st.error(f"Profile not saved: {e}")
+        return None
+    update_default_index(profile_id, data)
+    return profile_id
+
+def generate_qr_code(data, filename, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
     qr_filepath = os.path.join(SAVE_DIR, filename)
-    img.save(qr_filepath)
-    return qr_filepath
+    return save_qr_png(data, qr_filepath, profile, print_size_mm)
+
+def generate_qr_codes(data, filename, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM, chunked=False):
+    # A sequence of small codes when chunked (a single code if the payload already fits)
+    parts = qr_chunks.split(data, encode_profile=profile) if chunked else [data]
+    return [generate_qr_code(part, part_filename(filename, index, len(parts)), profile, print_size_mm)
+            for index, part in enumerate(parts, 1)]
+
+def qr_captions(count, caption):
+    return [caption] if count == 1 else [f"{caption} ({index} of {count})" for index in range(1, count + 1)]
 
 def decode_qr_code(uploaded_file):
     try:
-        # Open the uploaded file as an image
-        image = Image.open(uploaded_file)
-        # Decode the QR code
-        qr_data = decode(image)
-        if qr_data:
-            return qr_data[0].data.decode("utf-8")
+        # Cheap downscaled pass first, sharper/binarized passes only on failure
+        result = get_default_ladder().decode(uploaded_file)
+        if result.symbols:
+            return profile_codec.to_json_text(result.symbols[0].data.decode("utf-8"))
         else:
             return "No QR code found in the uploaded image."
     except Exception as e:
         return f"Error decoding QR code: {e}"
 
 def compare_profiles_ai(profile1, profile2):
-    from sklearn.feature_extraction.text import CountVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
-
-    # Combine profile attributes into strings for comparison
-    profile1_text = " ".join(
-        profile1.get("hobbies", []) +
-        profile1.get("tastes", []) +
-        profile1.get("skills", []) +
-        profile1.get("preferences", [])
-    )
-    profile2_text = " ".join(
-        profile2.get("hobbies", []) +
-        profile2.get("tastes", []) +
-        profile2.get("skills", []) +
-        profile2.get("preferences", [])
-    )
-
-    # Vectorize and calculate similarity
-    vectorizer = CountVectorizer().fit_transform([profile1_text, profile2_text])
-    vectors = vectorizer.toarray()
-    cosine_sim = cosine_similarity(vectors)
-    return cosine_sim[0][1] * 100  # Return percentage similarity
+    # NumPy/SciPy load with the first comparison, not at app start
+    from profile_vectors import get_default_vectorizer
+
+    # Shared vocabulary and cached vectors instead of a fresh CountVectorizer per call
+    vectorizer = get_default_vectorizer()
+    return vectorizer.similarity_matrix([profile1], [profile2])[0][0]  # Return percentage similarity
 
 # Streamlit App
 def main():
+    # Imports NumPy/OpenCV/SciPy in the background when QRDNA_WARMUP=1
+    start_warmup()
     st.title("Profile JSON Generator, Comparison, and QR Code")
 
     # Tabs for separate sections
@@ -88,6 +85,9 @@ def main():
         tastes = st.text_area("Tastes (comma-separated)", "")
         skills = st.text_area("Skills (comma-separated)", "")
         preferences = st.text_area("Preferences (comma-separated)", "")
+        compact = st.checkbox("Compact QR payload (smaller, faster to scan)")
+        chunked = st.checkbox("Split into a sequence of small QR codes (large profiles)")
+        encode_profile, print_size_mm = encode_profile_sidebar()
 
         # Generate JSON data
         data = {
@@ -105,13 +105,15 @@ def main():
         # Save JSON file and optionally generate QR code
         if st.button("Save JSON and Generate QR Code"):
             filename = f"{name.replace(' ', '_').lower()}_data.json"
-            filepath = save_json_file(data, filename)
-            st.success(f"Data saved as {filepath}")
+            profile_id = save_profile(data)
+            if profile_id is not None:
+                st.success(f"Data saved as profile #{profile_id}")
 
             qr_filename = f"{name.replace(' ', '_').lower()}_qr.png"
-            qr_filepath = generate_qr_code(json.dumps(data), qr_filename)
-            st.success(f"QR Code saved as {qr_filepath}")
-            st.image(qr_filepath, caption="Generated QR Code")
+            qr_filepaths = generate_qr_codes(profile_codec.dumps(data, compact=compact), qr_filename,
+                                             encode_profile, print_size_mm, chunked)
+            st.success(f"QR Code saved as {', '.join(qr_filepaths)}")
+            st.image(qr_filepaths, caption=qr_captions(len(qr_filepaths), "Generated QR Code"))
             st.download_button("Download JSON", data=json.dumps(data, indent=4), file_name=filename, mime="application/json")
 
     elif choice == "Compare Profiles":
@@ -124,8 +126,9 @@ def main():
 
         if uploaded_file1 and uploaded_file2:
             try:
-                profile1 = json.load(uploaded_file1)
-                profile2 = json.load(uploaded_file2)
+                with stage("json.parse"):
+                    profile1 = json.load(uploaded_file1)
+                    profile2 = json.load(uploaded_file2)
 
                 # Ensure all required keys are present in both profiles
                 required_keys = ["hobbies", "tastes", "skills", "preferences"]
@@ -150,11 +153,16 @@ def main():
         
         if uploaded_json_file:
             try:
-                json_data = json.load(uploaded_json_file)
+                with stage("json.parse"):
+                    json_data = json.load(uploaded_json_file)
+                compact = st.checkbox("Compact QR payload (smaller, faster to scan)")
+                chunked = st.checkbox("Split into a sequence of small QR codes (large profiles)")
+                encode_profile, print_size_mm = encode_profile_sidebar()
                 qr_filename = "uploaded_qr.png"
-                qr_filepath = generate_qr_code(json.dumps(json_data), qr_filename)
+                qr_filepaths = generate_qr_codes(profile_codec.dumps(json_data, compact=compact), qr_filename,
+                                                 encode_profile, print_size_mm, chunked)
                 st.success("QR Code generated successfully!")
-                st.image(qr_filepath, caption="Generated QR Code")
+                st.image(qr_filepaths, caption=qr_captions(len(qr_filepaths), "Generated QR Code"))
             except json.JSONDecodeError:
                 st.error("Invalid JSON file. Please upload a valid JSON file.")
 
@@ -172,6 +180,8 @@ def main():
                 st.success("QR Code Decoded Successfully!")
                 st.write(f"Decoded Data: {decoded_data}")
 
+    profiling_sidebar()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
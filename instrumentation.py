@@ -0,0 +1,251 @@
+"""
+Per-stage timing for the encode, decode and compare paths.
+
+Wrap a stage in `with stage("qr.make"):`. While profiling is off (the
+default) stage() returns a shared no-op context manager, so the cost is one
+flag check. Turn it on with QRDNA_PROFILE=1 or the "Stage timings" sidebar
+checkbox.
+
+Samples feed Prometheus-style histograms (see prometheus_text() and
+write_textfile() for a node_exporter textfile collector) and, when
+QRDNA_PROFILE_LOG is set, a JSONL log with one line per sample:
+
+    QRDNA_PROFILE=1 QRDNA_PROFILE_LOG=stages.jsonl streamlit run app.py
+    python instrumentation.py stages.jsonl
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_enabled = os.environ.get("QRDNA_PROFILE", "") not in ("", "0")
+_log_path = os.environ.get("QRDNA_PROFILE_LOG")
+_log_file = None
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class Histogram:
+    """
+    Cumulative bucket counts plus a window of recent samples for live percentiles.
+    """
+
+    def __init__(self, buckets=BUCKETS, window=2048):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            yield bound, running
+
+
+class _Registry:
+    def __init__(self):
+        self.histograms = OrderedDict()
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if _log_file is not None:
+                _log_file.write(json.dumps({"ts": round(time.time(), 6), "stage": name, "seconds": seconds}) + "\n")
+
+
+_registry = _Registry()
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _registry.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def stage(name):
+    """
+    Context manager timing one stage; a shared no-op while profiling is disabled.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def is_enabled():
+    return _enabled
+
+
+def set_enabled(enabled=True):
+    global _enabled
+    _enabled = bool(enabled)
+    if _enabled and _log_path:
+        _open_log()
+
+
+def _open_log():
+    global _log_file
+    with _registry.lock:
+        if _log_file is None:
+            _log_file = open(_log_path, "a", buffering=64 * 1024)
+            atexit.register(_log_file.close)
+
+
+def reset():
+    with _registry.lock:
+        _registry.histograms.clear()
+
+
+def summary():
+    """
+    One row per stage with count, mean and p50/p95/p99 in milliseconds (recent samples).
+    """
+    with _registry.lock:
+        items = [(name, histogram.count, histogram.total, list(histogram.recent))
+                 for name, histogram in _registry.histograms.items()]
+    return [
+        {
+            "stage": name,
+            "count": count,
+            "mean_ms": round(total / count * 1000, 3),
+            "p50_ms": round(_percentile(recent, 50) * 1000, 3),
+            "p95_ms": round(_percentile(recent, 95) * 1000, 3),
+            "p99_ms": round(_percentile(recent, 99) * 1000, 3),
+        }
+        for name, count, total, recent in items
+    ]
+
+
+def prometheus_text():
+    """
+    Histograms in the Prometheus text exposition format.
+    """
+    lines = ["# HELP qrdna_stage_seconds Time spent per encode/decode stage.",
+             "# TYPE qrdna_stage_seconds histogram"]
+    with _registry.lock:
+        for name, histogram in _registry.histograms.items():
+            for bound, count in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'qrdna_stage_seconds_bucket{{stage="{name}",le="{le}"}} {count}')
+            lines.append(f'qrdna_stage_seconds_sum{{stage="{name}"}} {histogram.total:.6f}')
+            lines.append(f'qrdna_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """
+    Atomically writes prometheus_text() to `path` (for a textfile collector).
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as prom_file:
+        prom_file.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return path
+
+
+def profiling_sidebar():
+    """
+    Streamlit sidebar toggle with live p50/p95/p99 per stage. Call it at the end of main().
+    """
+    import streamlit as st
+
+    enabled = st.sidebar.checkbox("Stage timings", value=is_enabled(), key="qrdna_stage_timings")
+    if enabled != is_enabled():
+        set_enabled(enabled)
+    if not enabled:
+        return
+    rows = summary()
+    if rows:
+        st.sidebar.dataframe(rows, hide_index=True)
+    else:
+        st.sidebar.caption("No stages timed yet; use the app and they appear here.")
+    if st.sidebar.button("Reset timings"):
+        reset()
+    st.sidebar.download_button("Download metrics", prometheus_text(), "qrdna_metrics.prom", mime="text/plain")
+
+
+def summarize_log(path):
+    samples = OrderedDict()
+    with open(path, "r") as log_file:
+        for line in log_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            samples.setdefault(record["stage"], []).append(record["seconds"])
+    return [
+        {
+            "stage": name,
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50) * 1000, 3),
+            "p95_ms": round(_percentile(values, 95) * 1000, 3),
+            "p99_ms": round(_percentile(values, 99) * 1000, 3),
+        }
+        for name, values in samples.items()
+    ]
+
+
+if _enabled and _log_path:
+    _open_log()
+
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print("usage: python instrumentation.py STAGES.jsonl", file=sys.stderr)
+        return 2
+    for path in paths:
+        for row in summarize_log(path):
+            print(json.dumps(row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
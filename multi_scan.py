@@ -0,0 +1,345 @@
+"""
+Concurrent scanning of several cameras, video files or stream URLs.
+
+Every source gets its own capture thread (a ScanPipeline with no decode
+workers) and its own RoiDecoder, so ROI tracking stays per camera. A fixed
+pool of decode threads is shared by all streams: the scheduler hands out the
+newest frame of each stream round-robin and never gives one stream to two
+workers at once, so a busy camera can't starve the others. Total CPU is
+bounded by the worker count, the per-stream `max_fps` cap and OpenCV's own
+thread count.
+
+Results are debounced per stream: a code seen again on the same stream
+within `debounce_s` of its last sighting is suppressed, so a badge held in
+front of a camera is reported once. Chunked payloads (see qr_chunks) are
+reassembled per stream and reported once complete.
+
+    python multi_scan.py 0 1 entrance.mp4 --workers 2 --max-fps 15 --debounce 2
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from qr_chunks import Reassembler
+from scan_pipeline import FrameRing, RoiDecoder, ScanPipeline, parse_source, percentile
+
+StreamResult = namedtuple("StreamResult", ["stream", "data", "polygon", "rect", "frame_index", "latency"])
+
+
+class Debouncer:
+    """
+    Suppresses a code until it has been out of sight for `window` seconds.
+
+    Every sighting refreshes the code's timestamp, so a code that stays in
+    front of the camera is reported only once.
+    """
+
+    def __init__(self, window=2.0, max_codes=1024):
+        self.window = window
+        self.max_codes = max_codes
+        self.suppressed = 0
+        self._last_seen = {}
+
+    def accept(self, data, now):
+        last_seen = self._last_seen.get(data)
+        self._last_seen[data] = now
+        if last_seen is not None and now - last_seen < self.window:
+            self.suppressed += 1
+            return False
+        if len(self._last_seen) > self.max_codes:
+            self._last_seen = {code: seen for code, seen in self._last_seen.items() if now - seen < self.window}
+        return True
+
+
+class FairScheduler:
+    """
+    Round-robin over streams that have a frame waiting; a stream is decoded by at most one worker at a time.
+    """
+
+    def __init__(self):
+        self.streams = []
+        self.exhausted = False
+        self._busy = set()
+        self._next = 0
+        self._cond = threading.Condition()
+
+    def add(self, stream):
+        with self._cond:
+            self.streams.append(stream)
+
+    def notify(self):
+        with self._cond:
+            self._cond.notify()
+
+    def acquire(self, timeout=None):
+        """
+        Returns (stream, frame item) for the next stream in turn, or None on timeout or once every source is done.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            while not self.exhausted:
+                # Capture threads close their ring after the last put, so rings closed before this
+                # pass can't receive another frame while it runs
+                all_closed = all(stream.ring.closed for stream in self.streams)
+                count = len(self.streams)
+                for offset in range(count):
+                    index = (self._next + offset) % count
+                    stream = self.streams[index]
+                    if index in self._busy:
+                        continue
+                    item = stream.ring.take_newest(timeout=0)
+                    if item is not None:
+                        self._busy.add(index)
+                        self._next = (index + 1) % count
+                        return stream, item
+                if all_closed and not self._busy:
+                    self.exhausted = True
+                    self._cond.notify_all()
+                    return None
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return None
+
+    def release(self, stream):
+        with self._cond:
+            self._busy.discard(stream.index)
+            self._cond.notify()
+
+
+class _SchedulerRing(FrameRing):
+    """
+    FrameRing that wakes the scheduler after each put; the ring lock is released first.
+    """
+
+    def __init__(self, size, scheduler):
+        super().__init__(size)
+        self._scheduler = scheduler
+
+    def put(self, item):
+        super().put(item)
+        self._scheduler.notify()
+
+    def close(self):
+        super().close()
+        self._scheduler.notify()
+
+
+class Stream:
+    """
+    One source: its capture pipeline, ring buffer, debouncer and chunk reassembler.
+    """
+
+    def __init__(self, index, source, pipeline, debouncer):
+        self.index = index
+        self.source = source
+        self.pipeline = pipeline
+        self.debouncer = debouncer
+        self.reassembler = Reassembler()
+
+    @property
+    def ring(self):
+        return self.pipeline.ring
+
+    @property
+    def latest_frame(self):
+        return self.pipeline.latest_frame
+
+
+class MultiScanner:
+    """
+    N capture threads feeding a shared pool of `workers` decode threads.
+
+    `decoder_factory` builds one decoder per stream (default: RoiDecoder()).
+    `cv_threads` is passed to cv2.setNumThreads, which is process-wide; None
+    leaves OpenCV's setting alone.
+    """
+
+    def __init__(self, sources, workers=2, max_fps=15, debounce_s=2.0, buffer_size=2, decoder_factory=None,
+                 realtime=None, cv_threads=1, max_results=256):
+        self.workers = workers
+        self.cv_threads = cv_threads
+        self.results_dropped = 0
+        self._scheduler = FairScheduler()
+        self._results = queue.Queue(maxsize=max_results)
+        self._stop = threading.Event()
+        self._threads = []
+        decoder_factory = decoder_factory or RoiDecoder
+        for index, source in enumerate(sources):
+            ring = _SchedulerRing(buffer_size, self._scheduler)
+            pipeline = ScanPipeline(source, buffer_size, workers=0, decoder=decoder_factory(), realtime=realtime,
+                                    max_fps=max_fps, ring=ring)
+            self._scheduler.add(Stream(index, source, pipeline, Debouncer(debounce_s)))
+
+    @property
+    def streams(self):
+        return self._scheduler.streams
+
+    def start(self):
+        if self.cv_threads is not None:
+            import cv2
+            cv2.setNumThreads(self.cv_threads)
+        for stream in self.streams:
+            stream.pipeline.start()
+        self._threads = [
+            threading.Thread(target=self._decode_loop, name=f"qr-multi-decode-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for stream in self.streams:
+            stream.pipeline.stop()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def finished(self):
+        """
+        True once every source is exhausted (or failed) and the workers have drained them.
+        """
+        return self._scheduler.exhausted and not any(thread.is_alive() for thread in self._threads)
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            acquired = self._scheduler.acquire(timeout=0.5)
+            if acquired is None:
+                if self._scheduler.exhausted:
+                    return
+                continue
+            stream, (frame_index, captured_at, frame) = acquired
+            try:
+                decoded_objects = stream.pipeline.decoder(frame)
+                now = time.perf_counter()
+                latency = now - captured_at
+                stream.pipeline.stats.record_frame(latency, len(decoded_objects))
+                for obj in decoded_objects:
+                    data = obj.data.decode("utf-8", errors="replace")
+                    if not stream.debouncer.accept(data, now):
+                        continue
+                    data = stream.reassembler.add(data)
+                    if data is None:
+                        continue
+                    try:
+                        self._results.put_nowait(
+                            StreamResult(stream.index, data, obj.polygon, obj.rect, frame_index, latency))
+                    except queue.Full:
+                        self.results_dropped += 1
+            except Exception as e:
+                # Counted (and the first one printed) per stream; a bad frame must not kill a shared worker
+                stream.pipeline.stats.record_error(e)
+            finally:
+                self._scheduler.release(stream)
+
+    def get_result(self, timeout=None):
+        """
+        Returns the next StreamResult, or None if nothing arrives within `timeout`.
+        """
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain_results(self):
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def summary(self):
+        """
+        Per-stream throughput and latency plus totals across all streams.
+        """
+        rows = []
+        latencies = []
+        for stream in self.streams:
+            row = {"stream": stream.index, "source": str(stream.source)}
+            row.update(stream.pipeline.summary())
+            row["suppressed"] = stream.debouncer.suppressed
+            row["pending_chunks"] = len(stream.reassembler.progress())
+            row["capture_failed"] = stream.pipeline.capture_failed
+            rows.append(row)
+            latencies.extend(stream.pipeline.stats.latencies)
+        totals = {
+            key: sum(row[key] for row in rows)
+            for key in ("captured", "throttled", "decoded_frames", "dropped_frames", "results", "suppressed",
+                        "decode_errors")
+        }
+        totals["decode_fps"] = round(sum(row["decode_fps"] for row in rows), 1)
+        totals["results_dropped"] = self.results_dropped
+        totals["latency_p50_ms"] = round(percentile(latencies, 50) * 1000, 2)
+        totals["latency_p95_ms"] = round(percentile(latencies, 95) * 1000, 2)
+        return {"workers": self.workers, "streams": rows, "total": totals}
+
+
+def format_stream_row(row):
+    return (f"stream {row['stream']} ({row['source']}): capture {row['capture_fps']} fps, "
+            f"decode {row['decode_fps']} fps, {row['results']} codes, {row['suppressed']} suppressed, "
+            f"{row['dropped_frames']} stale dropped, p95 {row['latency_p95_ms']} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan QR codes from several cameras, video files or streams.")
+    parser.add_argument("sources", nargs="+", help="Camera indexes, video file paths or stream URLs")
+    parser.add_argument("--workers", type=int, default=2, help="Decode threads shared by all streams")
+    parser.add_argument("--max-fps", type=float, default=15.0, help="Frames per second decoded per stream (0: no cap)")
+    parser.add_argument("--debounce", type=float, default=2.0, help="Seconds a code stays suppressed per stream")
+    parser.add_argument("--buffer", type=int, default=2, help="Ring buffer size in frames per stream")
+    parser.add_argument("--scale", type=float, default=0.5, help="Downscale factor for the detection pass")
+    parser.add_argument("--cv-threads", type=int, default=1, help="OpenCV threads (-1: leave OpenCV's default)")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between per-stream reports (0: off)")
+    parser.add_argument("--no-realtime", action="store_true", help="Read file sources as fast as possible")
+    args = parser.parse_args(argv)
+
+    scanner = MultiScanner(
+        [parse_source(source) for source in args.sources],
+        workers=args.workers,
+        max_fps=args.max_fps or None,
+        debounce_s=args.debounce,
+        buffer_size=args.buffer,
+        decoder_factory=lambda: RoiDecoder(scale=args.scale),
+        realtime=False if args.no_realtime else None,
+        cv_threads=None if args.cv_threads < 0 else args.cv_threads,
+    )
+    next_report = time.perf_counter() + args.report_every
+    with scanner:
+        try:
+            while not scanner.finished:
+                result = scanner.get_result(timeout=0.5)
+                if result:
+                    print(f"stream {result.stream} frame {result.frame_index}: {result.data} "
+                          f"({result.latency * 1000:.1f} ms)")
+                if args.report_every and time.perf_counter() >= next_report:
+                    next_report += args.report_every
+                    for row in scanner.summary()["streams"]:
+                        print(format_stream_row(row), file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+        for result in scanner.drain_results():
+            print(f"stream {result.stream} frame {result.frame_index}: {result.data} "
+                  f"({result.latency * 1000:.1f} ms)")
+    summary = scanner.summary()
+    for row in summary["streams"]:
+        print(format_stream_row(row), file=sys.stderr)
+    print(json.dumps(summary["total"]), file=sys.stderr)
+    return 1 if all(row["capture_failed"] for row in summary["streams"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
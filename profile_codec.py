@@ -0,0 +1,301 @@
+"""
+Compact QR payload format for profiles.
+
+A compact payload is "QD1:" followed by base45 text. Base45 only uses the
+QR alphanumeric character set, so the whole payload is encoded in the
+denser alphanumeric mode. The decoded bytes are a flags byte followed by an
+optionally deflated body:
+
+    varint  presence bitmap over FIELDS
+    varint  number of strings, then each string as varint length + UTF-8
+    per present field: varint (int), string index (str) or count + indices (list)
+
+Plain JSON payloads are still accepted everywhere a profile is read.
+
+    python profile_codec.py saved_data/*.json
+"""
+import json
+import sys
+import zlib
+
+from instrumentation import stage
+
+PREFIX = "QD1:"
+
+# Field table shared by the generators in app.py / demo.py and app_beta.py.
+# Append only: the bit position of a field is part of the format.
+FIELDS = [
+    (("name",), "str"),
+    (("age",), "int"),
+    (("email",), "str"),
+    (("phone",), "str"),
+    (("address",), "str"),
+    (("hobbies",), "list"),
+    (("tastes",), "list"),
+    (("skills",), "list"),
+    (("preferences",), "list"),
+    (("habits", "morning_routine"), "list"),
+    (("habits", "dietary_preferences"), "list"),
+    (("habits", "hobbies"), "list"),
+    (("habits", "sleep_schedule", "bedtime"), "str"),
+    (("habits", "sleep_schedule", "wake_time"), "str"),
+]
+
+FLAG_DEFLATE = 0x01
+
+BASE45_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+_BASE45_INDEX = {c: i for i, c in enumerate(BASE45_CHARSET)}
+
+
+# Base45 (RFC 9285)
+def base45_encode(raw):
+    out = []
+    for i in range(0, len(raw) - 1, 2):
+        n = raw[i] * 256 + raw[i + 1]
+        n, c = divmod(n, 45)
+        e, d = divmod(n, 45)
+        out.extend((BASE45_CHARSET[c], BASE45_CHARSET[d], BASE45_CHARSET[e]))
+    if len(raw) % 2:
+        d, c = divmod(raw[-1], 45)
+        out.extend((BASE45_CHARSET[c], BASE45_CHARSET[d]))
+    return "".join(out)
+
+
+def base45_decode(text):
+    try:
+        values = [_BASE45_INDEX[c] for c in text]
+    except KeyError as e:
+        raise ValueError(f"Invalid base45 character {e}") from None
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        chunk = values[i:i + 3]
+        if len(chunk) == 3:
+            n = chunk[0] + chunk[1] * 45 + chunk[2] * 45 * 45
+            if n > 0xFFFF:
+                raise ValueError("Invalid base45 payload")
+            out.extend(divmod(n, 256))
+        elif len(chunk) == 2:
+            n = chunk[0] + chunk[1] * 45
+            if n > 0xFF:
+                raise ValueError("Invalid base45 payload")
+            out.append(n)
+        else:
+            raise ValueError("Invalid base45 length")
+    return bytes(out)
+
+
+# Varints (unsigned LEB128)
+def write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def read_varint(raw, pos):
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(raw):
+            raise ValueError("Truncated compact payload")
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _get_path(profile, path):
+    value = profile
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _check_value(value, kind):
+    if kind == "str":
+        return isinstance(value, str)
+    if kind == "int":
+        return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def encode_profile(profile):
+    """
+    Encodes a profile as a compact "QD1:" payload.
+
+    Raises ValueError when the profile does not fit the field table exactly
+    (unknown keys, other types), so callers can fall back to JSON.
+    """
+    if not isinstance(profile, dict):
+        raise ValueError("Profile must be a JSON object")
+
+    presence = 0
+    strings = {}
+    values = []
+    for bit, (path, kind) in enumerate(FIELDS):
+        value = _get_path(profile, path)
+        if value is None:
+            continue
+        if not _check_value(value, kind):
+            raise ValueError(f"Field {'.'.join(path)} is not a {kind}")
+        presence |= 1 << bit
+        if kind == "str":
+            value = strings.setdefault(value, len(strings))
+        elif kind == "list":
+            value = [strings.setdefault(item, len(strings)) for item in value]
+        values.append((kind, value))
+
+    body = bytearray()
+    write_varint(body, presence)
+    write_varint(body, len(strings))
+    for text in strings:
+        encoded = text.encode("utf-8")
+        write_varint(body, len(encoded))
+        body.extend(encoded)
+    for kind, value in values:
+        if kind == "list":
+            write_varint(body, len(value))
+            for index in value:
+                write_varint(body, index)
+        else:
+            write_varint(body, value)
+
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    deflated = compressor.compress(bytes(body)) + compressor.flush()
+    if len(deflated) < len(body):
+        raw = bytes([FLAG_DEFLATE]) + deflated
+    else:
+        raw = bytes([0]) + bytes(body)
+
+    payload = PREFIX + base45_encode(raw)
+    if decode_profile(payload) != profile:
+        raise ValueError("Profile has fields outside the compact schema")
+    return payload
+
+
+def decode_profile(text):
+    """
+    Decodes a compact "QD1:" payload back into a profile dict.
+    """
+    if not is_compact(text):
+        raise ValueError("Not a compact profile payload")
+    raw = base45_decode(text[len(PREFIX):])
+    if not raw:
+        raise ValueError("Empty compact payload")
+    flags, body = raw[0], raw[1:]
+    if flags & FLAG_DEFLATE:
+        try:
+            body = zlib.decompress(body, -15)
+        except zlib.error as e:
+            raise ValueError(f"Corrupt compact payload: {e}") from None
+
+    presence, pos = read_varint(body, 0)
+    count, pos = read_varint(body, pos)
+    strings = []
+    for _ in range(count):
+        length, pos = read_varint(body, pos)
+        strings.append(body[pos:pos + length].decode("utf-8"))
+        pos += length
+
+    def lookup(index):
+        if index >= len(strings):
+            raise ValueError("Corrupt compact payload: bad string index")
+        return strings[index]
+
+    profile = {}
+    for bit, (path, kind) in enumerate(FIELDS):
+        if not presence >> bit & 1:
+            continue
+        value, pos = read_varint(body, pos)
+        if kind == "str":
+            value = lookup(value)
+        elif kind == "list":
+            items = []
+            for _ in range(value):
+                index, pos = read_varint(body, pos)
+                items.append(lookup(index))
+            value = items
+        target = profile
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+    return profile
+
+
+def is_compact(text):
+    return isinstance(text, str) and text.startswith(PREFIX)
+
+
+def dumps(profile, compact=False, indent=None):
+    """
+    Serializes a profile for a QR code, using the compact format when asked and possible.
+    """
+    if compact:
+        try:
+            return encode_profile(profile)
+        except ValueError:
+            pass
+    return json.dumps(profile, indent=indent)
+
+
+def loads(text):
+    """
+    Parses a scanned payload, detecting compact and plain JSON profiles.
+    """
+    if is_compact(text):
+        with stage("payload.decode"):
+            return decode_profile(text)
+    with stage("json.parse"):
+        return json.loads(text)
+
+
+def to_json_text(text):
+    """
+    Normalizes a scanned payload to JSON text; non-compact payloads pass through unchanged.
+    """
+    if is_compact(text):
+        return json.dumps(decode_profile(text))
+    return text
+
+
+def payload_report(profile):
+    """
+    Payload size in bytes and resulting QR version for each serialization of `profile`.
+    """
+    from qr_encode import build_qr
+
+    variants = {
+        "json_indent4": json.dumps(profile, indent=4),
+        "json": json.dumps(profile),
+        "compact": dumps(profile, compact=True),
+    }
+    return {
+        name: {"bytes": len(payload.encode("utf-8")), "qr_version": build_qr(payload).version}
+        for name, payload in variants.items()
+    }
+
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print("usage: python profile_codec.py PROFILE.json [...]", file=sys.stderr)
+        return 2
+    print(f"{'profile':<40} {'json -i4':>14} {'json':>14} {'compact':>14}")
+    for path in paths:
+        with open(path, "r") as json_file:
+            report = payload_report(json.load(json_file))
+        cells = [f"{r['bytes']:>6}B v{r['qr_version']:<3}" for r in report.values()]
+        print(f"{path:<40} " + " ".join(f"{cell:>14}" for cell in cells))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Vectorized one-vs-many profile matching.
+
+Every profile becomes a sparse row of field-scoped tokens ("hobbies=reading",
+"email=a@b.c") weighted by the field weights from similarity.py. Queries are
+scored by IDF-weighted cosine similarity in one sparse matrix-vector
+product. Profiles are appended to flat token arrays, and the CSR matrix
+built from them is kept between queries: rows added since the last build
+go into a small tail matrix, which is folded into the main one only once
+it grows past a tenth of it, so an add-then-query cycle copies just the
+new rows. Row norms depend on the IDF weights, which every add changes, so
+they are recomputed with one sparse product per query after an add. NumPy
+and SciPy are imported on the first query, so apps that only save profiles
+don't load them.
+
+    python profile_index.py saved_data/sreelesh_data.json --top 5 --corpus saved_data/profiles.db
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+
+from similarity import DEFAULT_OTHER_WEIGHT, DEFAULT_WEIGHTS, normalize_profile
+
+# Directory to save files
+SAVE_DIR = "saved_data"
+# Rows added since the last build are kept in a tail matrix until there are more than this many, or a tenth of the index
+MERGE_MIN_ROWS = 1024
+
+
+class Vocabulary:
+    """
+    Append-only token -> column mapping that grows as new tokens are seen.
+    """
+
+    def __init__(self):
+        self._columns = {}
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __contains__(self, token):
+        return token in self._columns
+
+    def get(self, token):
+        return self._columns.get(token)
+
+    def add(self, token):
+        column = self._columns.get(token)
+        if column is None:
+            column = self._columns[token] = len(self._columns)
+        return column
+
+
+def profile_tokens(profile, weights=None):
+    """
+    Returns {token: weight} for a profile, with list items sharing their field's weight.
+    """
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    tokens = {}
+    for field, value in normalize_profile(profile).items():
+        weight = weights.get(field, DEFAULT_OTHER_WEIGHT)
+        if weight <= 0:
+            continue
+        if isinstance(value, frozenset):
+            share = weight / math.sqrt(len(value))
+            for item in value:
+                tokens[f"{field}={item}"] = share
+        else:
+            tokens[f"{field}={value}"] = weight
+    return tokens
+
+
+class ProfileIndex:
+    """
+    Incrementally updated sparse index answering top-k matches for a profile.
+
+    Adding a profile appends to the token arrays; the next query builds a
+    CSR block for the new rows only (see _prepare).
+    """
+
+    def __init__(self, weights=None):
+        self.weights = weights
+        self.vocabulary = Vocabulary()
+        self.keys = []
+        self._rows = {}
+        self._indptr = array("q", [0])
+        self._indices = array("q")
+        self._data = array("d")
+        self._alive = array("b")
+        self._df = array("q")
+        self._lock = threading.RLock()
+        # CSR blocks over rows [0, built) and [built, len(keys)), with their squared entries
+        self._matrix = None
+        self._tail = None
+        self._row_norms = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, key, profile):
+        """
+        Adds or replaces the profile stored under `key` (e.g. its file path).
+        """
+        tokens = profile_tokens(profile, self.weights)
+        with self._lock:
+            if key in self._rows:
+                self._remove_row(self._rows[key])
+            for token, weight in tokens.items():
+                column = self.vocabulary.add(token)
+                if column == len(self._df):
+                    self._df.append(0)
+                self._df[column] += 1
+                self._indices.append(column)
+                self._data.append(weight)
+            self._indptr.append(len(self._indices))
+            self._alive.append(1)
+            self._rows[key] = len(self.keys)
+            self.keys.append(key)
+            self._tail = None
+            self._row_norms = None
+
+    def remove(self, key):
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self._remove_row(row)
+                self._row_norms = None
+
+    def _remove_row(self, row):
+        self._alive[row] = 0
+        for column in self._indices[self._indptr[row]:self._indptr[row + 1]]:
+            self._df[column] -= 1
+
+    def _idf(self):
+        import numpy as np
+
+        df = np.frombuffer(self._df, dtype=np.int64) if len(self._df) else np.zeros(0, dtype=np.int64)
+        return np.log((1.0 + len(self._rows)) / (1.0 + df)) + 1.0
+
+    def _csr(self, start, stop):
+        """
+        (matrix, squared entries) for rows [start, stop), copied out of the token arrays.
+        """
+        import numpy as np
+        from scipy import sparse
+
+        indptr = np.frombuffer(self._indptr, dtype=np.int64)[start:stop + 1]
+        first, last = int(indptr[0]), int(indptr[-1])
+        matrix = sparse.csr_matrix(
+            (np.frombuffer(self._data, dtype=np.float64)[first:last].copy(),
+             np.frombuffer(self._indices, dtype=np.int64)[first:last].copy(),
+             indptr - first),
+            shape=(stop - start, len(self.vocabulary)),
+        )
+        return matrix, matrix.multiply(matrix).tocsr()
+
+    def _prepare(self):
+        """
+        Returns ([matrix blocks], row norms, idf), building only the rows added since the last call.
+        """
+        import numpy as np
+
+        built = 0 if self._matrix is None else self._matrix[0].shape[0]
+        pending = len(self.keys) - built
+        if self._matrix is None or pending > max(MERGE_MIN_ROWS, built // 10):
+            self._matrix = self._csr(0, len(self.keys))
+            self._tail = None
+            self._row_norms = None
+        elif pending and self._tail is None:
+            self._tail = self._csr(built, len(self.keys))
+        blocks = [self._matrix] if self._tail is None else [self._matrix, self._tail]
+        idf = self._idf()
+        if self._row_norms is None:
+            idf_squared = idf * idf
+            squared = np.concatenate([block[1] @ idf_squared[:block[1].shape[1]] for block in blocks])
+            norms = np.sqrt(squared)
+            norms[np.frombuffer(self._alive, dtype=np.int8) == 0] = 0.0
+            self._row_norms = norms
+        return [block[0] for block in blocks], self._row_norms, idf
+
+    def top_k(self, profile, k=5):
+        """
+        Returns up to k (key, score) pairs, best first, with scores as percentages.
+        """
+        import numpy as np
+
+        with self._lock:
+            if not self._rows:
+                return []
+            blocks, row_norms, idf = self._prepare()
+            query = np.zeros(len(self.vocabulary))
+            for token, weight in profile_tokens(profile, self.weights).items():
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    query[column] = weight
+            query *= idf
+            query_norm = np.linalg.norm(query)
+            if query_norm == 0:
+                return []
+            query *= idf
+            # Columns added after a block was built have no entries in it
+            scores = np.concatenate([block @ query[:block.shape[1]] for block in blocks])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.where(row_norms > 0, scores / (row_norms * query_norm), -1.0)
+            k = min(k, len(scores))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            keys = self.keys
+        return [(keys[row], float(scores[row]) * 100) for row in best if scores[row] >= 0]
+
+    @classmethod
+    def from_directory(cls, directory=SAVE_DIR, weights=None):
+        return cls.from_records(iter_profile_files(directory), weights)
+
+    @classmethod
+    def from_records(cls, records, weights=None):
+        """
+        Builds an index from (key, profile) pairs, e.g. ProfileStore.iter_profiles().
+        """
+        index = cls(weights)
+        for key, profile in records:
+            index.add(key, profile)
+        return index
+
+
+def iter_profile_files(directory):
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not (entry.is_file() and entry.name.endswith(".json")):
+                continue
+            try:
+                with open(entry.path, "r") as json_file:
+                    profile = json.load(json_file)
+            except (OSError, ValueError):
+                continue
+            if isinstance(profile, dict):
+                yield entry.path, profile
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_default_index():
+    """
+    Process-wide index over the default profile store (keyed by profile id), built on first use.
+    """
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            from profile_store import get_default_store
+            _default_index = ProfileIndex.from_records(get_default_store().iter_profiles())
+        return _default_index
+
+
+def reset_default_index():
+    """
+    Drops the default index so it is rebuilt from the store on next use (after a bulk ingest).
+    """
+    global _default_index
+    with _default_lock:
+        _default_index = None
+
+
+def update_default_index(key, profile):
+    """
+    Adds a freshly saved profile to the default index if it has been built.
+    """
+    if _default_index is not None:
+        _default_index.add(key, profile)
+
+
+def main(argv=None):
+    from profile_store import STORE_PATH, iter_source
+
+    parser = argparse.ArgumentParser(description="Find the closest stored profiles to a profile.")
+    parser.add_argument("profile", help="Profile JSON file to match")
+    parser.add_argument("--corpus", default=STORE_PATH, help="Profile store (*.db) or directory of *.json profiles")
+    parser.add_argument("--top", type=int, default=5, help="Number of matches to show")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index = ProfileIndex.from_records(iter_source(args.corpus))
+    built = time.perf_counter()
+    with open(args.profile, "r") as json_file:
+        profile = json.load(json_file)
+    matches = index.top_k(profile, args.top)
+    queried = time.perf_counter()
+    for key, score in matches:
+        print(f"{score:6.2f}%  {key}")
+    print(f"{len(index)} profiles indexed in {(built - started) * 1000:.1f} ms, "
+          f"query {(queried - built) * 1000:.2f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
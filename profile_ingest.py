@@ -0,0 +1,341 @@
+"""
+Streaming ingest of bulk profile exports.
+
+Reads JSONL (or any whitespace-separated JSON objects, including a single
+pretty-printed profile) and JSON arrays one profile at a time. The file is
+read in fixed-size chunks and parsed with JSONDecoder.raw_decode, so only
+one chunk plus the record being parsed is held in memory, whatever the file
+size. Each profile is validated against the schema the generators build
+(profile_codec.FIELDS), valid ones go into the profile store in chunked
+transactions, and an optional reference profile is compared against every
+record as it goes, keeping only the top matches.
+
+    python profile_ingest.py vendor_export.jsonl
+    python profile_ingest.py vendor_export.json --reference me.json --top 10 --dry-run
+"""
+import argparse
+import codecs
+import heapq
+import json
+import re
+import sys
+import time
+from collections import deque, namedtuple
+
+from profile_codec import FIELDS
+from similarity import normalize_profile, normalized_similarity
+
+CHUNK_BYTES = 64 * 1024
+# Larger records are rejected instead of growing the buffer without limit
+MAX_RECORD_BYTES = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 1000
+MAX_AGE = 150
+
+Record = namedtuple("Record", ["number", "profile", "error"])
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def _schema():
+    # FIELDS as a nested {key: kind or sub-schema} tree
+    tree = {}
+    for path, kind in FIELDS:
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = kind
+    return tree
+
+
+SCHEMA = _schema()
+
+
+def _check(value, kind):
+    if kind == "str":
+        return isinstance(value, str)
+    if kind == "int":
+        return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= MAX_AGE
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def validate_profile(profile, allow_extra=False, schema=SCHEMA, prefix=""):
+    """
+    List of problems with `profile` (empty when valid). Every field is optional
+    except a non-empty name; unknown fields are problems unless `allow_extra`.
+    """
+    if not isinstance(profile, dict):
+        return [f"{prefix.rstrip('.') or 'record'} is not a JSON object"]
+    errors = []
+    if not prefix and not (isinstance(profile.get("name"), str) and profile["name"].strip()):
+        errors.append("name is missing or empty")
+    for key, value in profile.items():
+        kind = schema.get(key)
+        if kind is None:
+            if not allow_extra:
+                errors.append(f"unknown field {prefix}{key}")
+        elif isinstance(kind, dict):
+            errors.extend(validate_profile(value, allow_extra, kind, f"{prefix}{key}."))
+        elif not _check(value, kind):
+            expected = {"str": "a string", "int": f"an integer from 0 to {MAX_AGE}", "list": "a list of strings"}[kind]
+            errors.append(f"{prefix}{key} is not {expected}")
+    return errors
+
+
+class _Reader:
+    """
+    Incrementally decoded text buffer over a binary stream, counting bytes read.
+    """
+
+    def __init__(self, stream, chunk_bytes, stats):
+        self.stream = stream
+        self.chunk_bytes = chunk_bytes
+        self.stats = stats
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        raw = self.stream.read(self.chunk_bytes)
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        self.stats.bytes_read += len(raw)
+        self.eof = not raw
+        # Drop what has been parsed already, so the buffer never holds more than one record plus a chunk
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(raw, final=self.eof)
+        self.pos = 0
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return
+            self.fill()
+
+    def peek(self):
+        self.skip_whitespace()
+        return self.buffer[self.pos] if self.pos < len(self.buffer) else ""
+
+
+def iter_records(stream, chunk_bytes=CHUNK_BYTES, max_record_bytes=MAX_RECORD_BYTES, stats=None):
+    """
+    Yields a Record per JSON value in a binary stream holding a JSON array or
+    whitespace-separated values (JSONL).
+
+    A malformed JSONL line is reported as an error record and skipped; a
+    malformed array can't be resynchronized and raises ValueError.
+    """
+    stats = stats if stats is not None else IngestStats()
+    reader = _Reader(stream, chunk_bytes, stats)
+    is_array = reader.peek() == "["
+    if is_array:
+        reader.pos += 1
+    number = 0
+    while True:
+        if is_array:
+            character = reader.peek()
+            if character == "]":
+                return
+            if number and character != ",":
+                if not character:
+                    raise ValueError("JSON array is not closed")
+                raise ValueError(f"Expected ',' or ']' after record {number}")
+            if number:
+                reader.pos += 1
+        if not reader.peek():
+            if is_array:
+                raise ValueError("JSON array is not closed")
+            return
+        number += 1
+        while True:
+            try:
+                value, end = _decoder.raw_decode(reader.buffer, reader.pos)
+            except json.JSONDecodeError as e:
+                # A record cut off by the end of the buffer fails on its last line; an error
+                # followed by a newline is real, and the rest of that record's line is skipped
+                if reader.eof or reader.buffer.find("\n", e.pos) != -1:
+                    if is_array:
+                        raise ValueError(f"Invalid JSON in record {number}: {e.msg}") from None
+                    yield Record(number, None, f"invalid JSON: {e.msg}")
+                    _skip_line(reader)
+                    break
+                if len(reader.buffer) - reader.pos > max_record_bytes:
+                    if is_array:
+                        raise ValueError(f"Record {number} is larger than {max_record_bytes} bytes") from None
+                    yield Record(number, None, f"record is larger than {max_record_bytes} bytes")
+                    _skip_line(reader)
+                    break
+                reader.fill()
+                continue
+            if end == len(reader.buffer) and not reader.eof:
+                # A bare number may continue in the next chunk
+                reader.fill()
+                continue
+            reader.pos = end
+            yield Record(number, value, None)
+            break
+
+
+def _skip_line(reader):
+    while True:
+        newline = reader.buffer.find("\n", reader.pos)
+        if newline != -1:
+            reader.pos = newline + 1
+            return
+        reader.pos = len(reader.buffer)
+        if reader.eof:
+            return
+        reader.fill()
+
+
+class IngestStats:
+    """
+    Running counters, a bounded sample of errors and the best matches so far.
+    """
+
+    def __init__(self, max_errors=100, top_k=10):
+        self.started = time.perf_counter()
+        self.bytes_read = 0
+        self.records = 0
+        self.valid = 0
+        self.invalid = 0
+        self.inserted = 0
+        self.above_threshold = 0
+        self.top_k = top_k
+        self.errors = deque(maxlen=max_errors)
+        self._matches = []
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    def add_match(self, score, number, profile):
+        entry = (score, -number, number, profile.get("name"), profile.get("email"))
+        if len(self._matches) < self.top_k:
+            heapq.heappush(self._matches, entry)
+        elif entry > self._matches[0]:
+            heapq.heapreplace(self._matches, entry)
+
+    def matches(self):
+        """
+        Best matches first: [{"record", "name", "email", "similarity"}].
+        """
+        return [
+            {"record": number, "name": name, "email": email, "similarity": round(score, 2)}
+            for score, _, number, name, email in sorted(self._matches, reverse=True)
+        ]
+
+    def summary(self):
+        return {
+            "records": self.records,
+            "valid": self.valid,
+            "invalid": self.invalid,
+            "inserted": self.inserted,
+            "above_threshold": self.above_threshold,
+            "bytes_read": self.bytes_read,
+            "elapsed_s": round(self.elapsed, 3),
+            "records_per_s": round(self.rate, 1),
+        }
+
+
+def ingest(stream, store=None, chunk_size=DEFAULT_CHUNK_SIZE, reference=None, threshold=80.0, top_k=10,
+           allow_extra=False, source_name=None, stats=None, on_progress=None):
+    """
+    Streams profiles from `stream` into `store` (None for a dry run) and returns IngestStats.
+
+    Valid profiles are inserted `chunk_size` at a time. With `source_name`,
+    each row is keyed "<source_name>:<record>", so re-running the same file
+    skips what is already stored. With a `reference` profile every record is
+    scored with the field-aware similarity; the `top_k` best are kept and
+    those at or above `threshold` are counted. `on_progress(stats)` is called
+    after every chunk.
+    """
+    stats = stats if stats is not None else IngestStats(top_k=top_k)
+    reference_fields = normalize_profile(reference) if reference is not None else None
+    chunk = []
+
+    def flush():
+        if store is not None and chunk:
+            stats.inserted += store.bulk_insert(chunk, chunk_size, source=source_name is not None)
+        chunk.clear()
+        if on_progress is not None:
+            on_progress(stats)
+
+    for record in iter_records(stream, stats=stats):
+        stats.records += 1
+        errors = [record.error] if record.error else validate_profile(record.profile, allow_extra)
+        if errors:
+            stats.invalid += 1
+            stats.errors.append({"record": record.number, "errors": errors})
+            continue
+        stats.valid += 1
+        profile = record.profile
+        if reference_fields is not None:
+            score = normalized_similarity(reference_fields, normalize_profile(profile))
+            stats.above_threshold += score >= threshold
+            stats.add_match(score, record.number, profile)
+        chunk.append((f"{source_name}:{record.number}", profile) if source_name is not None else profile)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+
+    if stats.inserted:
+        from profile_index import reset_default_index
+        reset_default_index()
+    return stats
+
+
+def main(argv=None):
+    from profile_store import STORE_PATH, ProfileStore
+
+    parser = argparse.ArgumentParser(description="Stream a JSONL or JSON-array profile export into the store.")
+    parser.add_argument("path", help="JSONL or JSON file ('-' reads stdin)")
+    parser.add_argument("--db", default=STORE_PATH, help="Store path")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Profiles per transaction")
+    parser.add_argument("--reference", help="Profile JSON file to compare every record against")
+    parser.add_argument("--threshold", type=float, default=80.0, help="Similarity counted as a match")
+    parser.add_argument("--top", type=int, default=10, help="Best matches to report")
+    parser.add_argument("--allow-extra", action="store_true", help="Accept fields the generators don't produce")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and compare without storing")
+    parser.add_argument("--errors", help="Write the first invalid records to this JSONL file")
+    args = parser.parse_args(argv)
+
+    reference = None
+    if args.reference:
+        with open(args.reference, "r") as json_file:
+            reference = json.load(json_file)
+    store = None if args.dry_run else ProfileStore(args.db)
+
+    def report(stats):
+        print(f"{stats.records} records, {stats.invalid} invalid, {stats.rate:.0f} records/s", file=sys.stderr)
+
+    stream = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        stats = ingest(stream, store, args.chunk_size, reference, args.threshold, args.top, args.allow_extra,
+                       source_name=None if args.path == "-" else args.path, on_progress=report)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+        if store is not None:
+            store.close()
+    if args.errors:
+        with open(args.errors, "w") as errors_file:
+            for error in stats.errors:
+                errors_file.write(json.dumps(error) + "\n")
+    summary = stats.summary()
+    if reference is not None:
+        summary["matches"] = stats.matches()
+    print(json.dumps(summary))
+    return 1 if stats.invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
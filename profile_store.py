@@ -0,0 +1,271 @@
+"""
+Indexed SQLite profile store replacing one JSON file per profile.
+
+Profiles get an integer id; email and phone are stored normalized and
+indexed for constant-time lookup, so names no longer collide. Bulk inserts
+run in chunked transactions and iteration streams rows with a cursor.
+
+    python profile_store.py import saved_data
+    python profile_store.py get 42
+    python profile_store.py find --email someone@example.com
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from similarity import normalize_text
+
+# Directory to save files
+SAVE_DIR = "saved_data"
+STORE_PATH = os.path.join(SAVE_DIR, "profiles.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    email TEXT,
+    phone TEXT,
+    source TEXT,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_profiles_email ON profiles (email);
+CREATE INDEX IF NOT EXISTS idx_profiles_phone ON profiles (phone);
+CREATE INDEX IF NOT EXISTS idx_profiles_name ON profiles (name);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_profiles_source ON profiles (source) WHERE source IS NOT NULL;
+"""
+
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_name(name):
+    return normalize_text(name) or None if name else None
+
+
+def normalize_email(email):
+    return normalize_text(email) or None if email else None
+
+
+def normalize_phone(phone):
+    return _NON_DIGITS.sub("", str(phone)) or None if phone else None
+
+
+def _row_values(profile, source):
+    if not isinstance(profile, dict):
+        raise ValueError("profile must be a JSON object")
+    return (
+        normalize_name(profile.get("name")),
+        normalize_email(profile.get("email")),
+        normalize_phone(profile.get("phone")),
+        source,
+        time.time(),
+        json.dumps(profile),
+    )
+
+
+class ProfileStore:
+    """
+    SQLite-backed profile store, safe to share between Streamlit sessions.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def insert(self, profile, source=None):
+        """
+        Stores one profile and returns its id. With `source`, a profile already
+        stored under that source is left alone and its id is returned.
+
+        Raises ValueError if `profile` isn't a dict.
+        """
+        values = _row_values(profile, source)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO profiles (name, email, phone, source, created_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                values,
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid
+        return self.id_for_source(source)
+
+    def id_for_source(self, source):
+        """
+        Id of the profile stored under `source`, or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM profiles WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def bulk_insert(self, profiles, chunk_size=1000, source=None):
+        """
+        Inserts an iterable of profiles (or (source, profile) pairs when `source` is True)
+        in one transaction per chunk. Rows with an already imported source are skipped.
+        Raises ValueError on a profile that isn't a dict.
+
+        Returns the number of rows inserted.
+        """
+        inserted = 0
+        chunk = []
+        for item in profiles:
+            chunk.append(_row_values(item[1], item[0]) if source else _row_values(item, None))
+            if len(chunk) >= chunk_size:
+                inserted += self._insert_chunk(chunk)
+                chunk = []
+        if chunk:
+            inserted += self._insert_chunk(chunk)
+        return inserted
+
+    def _insert_chunk(self, rows):
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO profiles (name, email, phone, source, created_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def get(self, profile_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _find(self, column, value):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, data FROM profiles WHERE {column} = ? ORDER BY id", (value,)).fetchall()
+        return [(profile_id, json.loads(data)) for profile_id, data in rows]
+
+    def find_by_email(self, email):
+        return self._find("email", normalize_email(email))
+
+    def find_by_phone(self, phone):
+        return self._find("phone", normalize_phone(phone))
+
+    def find_by_name(self, name):
+        return self._find("name", normalize_name(name))
+
+    def iter_profiles(self, batch_size=500, after_id=0):
+        """
+        Streams (id, profile) in id order without loading the whole table.
+        """
+        last_id = after_id
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, data FROM profiles WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for profile_id, data in rows:
+                yield profile_id, json.loads(data)
+            last_id = rows[-1][0]
+
+    def import_json_dir(self, directory=SAVE_DIR, chunk_size=1000):
+        """
+        Imports every *.json profile in `directory`; re-running skips files already imported.
+        """
+        from profile_index import iter_profile_files
+        return self.bulk_insert(
+            ((os.path.basename(path), profile) for path, profile in iter_profile_files(directory)),
+            chunk_size,
+            source=True,
+        )
+
+
+def iter_source(source):
+    """
+    Yields (key, profile) from a store file (*.db, keyed by id) or a directory of *.json files.
+    """
+    if source.endswith(".db"):
+        with ProfileStore(source) as store:
+            yield from store.iter_profiles()
+    else:
+        from profile_index import iter_profile_files
+        yield from iter_profile_files(source)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_default_store(path=STORE_PATH):
+    """
+    Process-wide store. A newly created store imports the legacy saved_data/*.json files.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            is_new = not os.path.exists(path)
+            _default_store = ProfileStore(path)
+            if is_new:
+                _default_store.import_json_dir(os.path.dirname(path) or ".")
+        return _default_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the profile store.")
+    parser.add_argument("--db", default=STORE_PATH, help="Store path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Import *.json profiles from a directory")
+    import_parser.add_argument("directory", nargs="?", default=SAVE_DIR)
+    get_parser = commands.add_parser("get", help="Print a profile by id")
+    get_parser.add_argument("id", type=int)
+    find_parser = commands.add_parser("find", help="Find profiles by email or phone")
+    find_parser.add_argument("--email")
+    find_parser.add_argument("--phone")
+    commands.add_parser("count", help="Print the number of stored profiles")
+    commands.add_parser("export", help="Stream all profiles as JSONL")
+    args = parser.parse_args(argv)
+
+    with ProfileStore(args.db) as store:
+        if args.command == "import":
+            started = time.perf_counter()
+            inserted = store.import_json_dir(args.directory)
+            print(f"Imported {inserted} profiles in {time.perf_counter() - started:.2f}s ({len(store)} stored)")
+        elif args.command == "get":
+            profile = store.get(args.id)
+            if profile is None:
+                print(f"No profile with id {args.id}", file=sys.stderr)
+                return 1
+            print(json.dumps(profile, indent=4))
+        elif args.command == "find":
+            matches = store.find_by_email(args.email) if args.email else store.find_by_phone(args.phone or "")
+            for profile_id, profile in matches:
+                print(json.dumps({"id": profile_id, "profile": profile}))
+        elif args.command == "count":
+            print(len(store))
+        else:
+            for profile_id, profile in store.iter_profiles():
+                print(json.dumps({"id": profile_id, "profile": profile}))
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
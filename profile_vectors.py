@@ -0,0 +1,157 @@
+"""
+Bag-of-words vectors behind compare_profiles_ai, with a shared vocabulary.
+
+Tokenization matches the CountVectorizer defaults that compare_profiles_ai
+used (lowercase, words of two or more characters) so scores are unchanged.
+The vocabulary only ever grows and each profile's vector is cached, so
+comparing a cohort against thousands of stored profiles is one sparse
+matrix product instead of one vectorizer fit per pair.
+
+    python profile_vectors.py new_profile.json --corpus saved_data/profiles.db --top 5
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from profile_index import Vocabulary
+from profile_store import STORE_PATH, iter_source
+
+# Profile fields compared by compare_profiles_ai
+AI_FIELDS = ("hobbies", "tastes", "skills", "preferences")
+
+# CountVectorizer's default token_pattern
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def profile_text(profile):
+    return " ".join(item for field in AI_FIELDS for item in profile.get(field, []))
+
+
+class ProfileVectorizer:
+    """
+    Incrementally extended vocabulary with cached, L2-normalized per-profile count vectors.
+    """
+
+    def __init__(self, cache_size=100000):
+        self.vocabulary = Vocabulary()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _vector(self, text):
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            return cached
+        counts = Counter(self.vocabulary.add(token) for token in TOKEN_PATTERN.findall(text.lower()))
+        columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        norm = np.linalg.norm(values)
+        if norm:
+            values /= norm
+        vector = (columns, values)
+        self._cache[text] = vector
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return vector
+
+    def transform(self, profiles):
+        """
+        Returns a CSR matrix with one normalized row per profile.
+        """
+        with self._lock:
+            vectors = [self._vector(profile_text(profile)) for profile in profiles]
+            width = len(self.vocabulary)
+        indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(columns) for columns, _ in vectors])
+        indices = np.concatenate([columns for columns, _ in vectors]) if vectors else np.zeros(0, dtype=np.int64)
+        data = np.concatenate([values for _, values in vectors]) if vectors else np.zeros(0)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(vectors), width))
+
+    def _as_matrix(self, profiles_or_matrix):
+        if sparse.issparse(profiles_or_matrix):
+            return profiles_or_matrix
+        return self.transform(profiles_or_matrix)
+
+    def _aligned(self, left, right):
+        width = max(left.shape[1], right.shape[1], len(self.vocabulary))
+        left = sparse.csr_matrix((left.data, left.indices, left.indptr), shape=(left.shape[0], width))
+        right = sparse.csr_matrix((right.data, right.indices, right.indptr), shape=(right.shape[0], width))
+        return left, right
+
+    def similarity_matrix(self, profiles_a, profiles_b):
+        """
+        Cosine similarity (as percentages) of every profile in A against every profile in B.
+
+        Either side may be a list of profiles or a matrix from transform().
+        """
+        left, right = self._aligned(self._as_matrix(profiles_a), self._as_matrix(profiles_b))
+        return (left @ right.T).toarray() * 100
+
+    def top_k(self, profiles_a, profiles_b, k=5, chunk_size=1024):
+        """
+        For each profile in A, the k best (column in B, score) pairs, best first.
+
+        A is processed in chunks so memory stays bounded by chunk_size x len(B).
+        """
+        left, right = self._aligned(self._as_matrix(profiles_a), self._as_matrix(profiles_b))
+        right_t = right.T.tocsr()
+        k = min(k, right.shape[0])
+        results = []
+        for start in range(0, left.shape[0], chunk_size):
+            scores = (left[start:start + chunk_size] @ right_t).toarray() * 100
+            if k == 0:
+                results.extend([] for _ in range(scores.shape[0]))
+                continue
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for row, columns in enumerate(best):
+                columns = columns[np.argsort(-scores[row, columns])]
+                results.append([(int(column), float(scores[row, column])) for column in columns])
+        return results
+
+
+_default_vectorizer = None
+_default_lock = threading.Lock()
+
+
+def get_default_vectorizer():
+    """
+    Process-wide vectorizer so the vocabulary and vector cache persist across calls.
+    """
+    global _default_vectorizer
+    with _default_lock:
+        if _default_vectorizer is None:
+            _default_vectorizer = ProfileVectorizer()
+        return _default_vectorizer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score profiles against a stored corpus.")
+    parser.add_argument("profiles", nargs="+", help="Profile JSON files to score")
+    parser.add_argument("--corpus", default=STORE_PATH, help="Profile store (*.db) or directory of *.json profiles")
+    parser.add_argument("--top", type=int, default=5, help="Matches per profile")
+    args = parser.parse_args(argv)
+
+    vectorizer = get_default_vectorizer()
+    entries = list(iter_source(args.corpus))
+    keys = [key for key, _ in entries]
+    corpus = [profile for _, profile in entries]
+    queries = []
+    for path in args.profiles:
+        with open(path, "r") as json_file:
+            queries.append(json.load(json_file))
+    for path, matches in zip(args.profiles, vectorizer.top_k(queries, corpus, args.top)):
+        print(path)
+        for column, score in matches:
+            print(f"  {score:6.2f}%  {keys[column]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
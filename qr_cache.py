@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from instrumentation import stage
+from qr_encode import SAVE_DIR, qr_params, qr_png_bytes
+
+CACHE_DIR = os.path.join(SAVE_DIR, "qr_cache")
+
+DEFAULT_MAX_ITEMS = 256
+DEFAULT_MAX_DISK_BYTES = 64 * 1024 * 1024
+
+
+def cache_key(data, params):
+    """
+    Content address for an encoded QR image: hash of payload plus QR parameters.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class QRCache:
+    """
+    Two-tier cache of QR PNG bytes: an in-memory LRU in front of a size-bounded on-disk store.
+
+    The in-memory tier also keeps the base64 form so the download link is
+    not re-encoded on every Streamlit rerun.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_items=DEFAULT_MAX_ITEMS, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.is_file())
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, data, params, encoder):
+        params = params if params is not None else qr_params()
+        key = cache_key(data, params)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as png_file:
+                png = png_file.read()
+            os.utime(path)
+            self.disk_hits += 1
+        except FileNotFoundError:
+            png = (encoder or qr_png_bytes)(data)
+            self.misses += 1
+            self._write_disk(path, png)
+
+        entry = {"png": png, "b64": None}
+        self._remember(key, entry)
+        return entry
+
+    def _write_disk(self, path, png):
+        # Files are content-addressed, so one already on disk (written by another thread
+        # or process since the lookup) holds these bytes and is counted in _disk_bytes
+        if os.path.exists(path):
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as png_file:
+            png_file.write(png)
+        with self._lock:
+            written = not os.path.exists(path)
+            if written:
+                os.replace(tmp_path, path)
+                self._disk_bytes += len(png)
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if not written:
+            os.remove(tmp_path)
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """
+        Deletes least recently used files until the disk tier is under 90% of its budget.
+        """
+        entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_file() and entry.name.endswith(".png")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        target = self.max_disk_bytes * 0.9
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def get_png(self, data, params=None, encoder=None):
+        """
+        Returns the PNG bytes for `data`, encoding only on a miss in both tiers.
+
+        `encoder` must produce the image described by `params`; by default
+        both come from qr_encode.
+        """
+        return self._lookup(data, params, encoder)["png"]
+
+    def get_base64(self, data, params=None, encoder=None):
+        entry = self._lookup(data, params, encoder)
+        if entry["b64"] is None:
+            with stage("base64.encode"):
+                entry["b64"] = base64.b64encode(entry["png"]).decode()
+        return entry["b64"]
+
+    def stats(self):
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Process-wide cache instance, shared by every Streamlit session in the server.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = QRCache()
+        return _default_cache
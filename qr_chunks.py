@@ -0,0 +1,284 @@
+"""
+Splitting large payloads across a sequence of small QR codes.
+
+Each code carries one chunk behind a header:
+
+    QC1:<id>:<index>:<count>:<crc>:<body>
+
+`id` names the sequence, `index` is 1-based, and `crc` is the CRC-32 (hex)
+of the whole payload, checked after reassembly. The header uses only QR
+alphanumeric characters, so chunks of a compact profile payload stay in the
+dense alphanumeric mode. Chunk bodies are sized so every code fits in
+`max_version` at the error-correction level of the encode profile used to
+render it, which keeps the codes small and quick to decode.
+
+The Reassembler collects chunks in any order, as frames arrive, and returns
+the payload once a sequence is complete. Partial sequences are bounded in
+number and expire after a TTL.
+
+    python qr_chunks.py profile.json out_dir/ --max-version 6
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+
+import qrcode
+from qrcode import util
+
+PREFIX = "QC1:"
+DEFAULT_MAX_VERSION = 6
+MAX_CHUNKS = 99
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_PENDING = 32
+
+_BASE36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_ALPHANUMERIC = frozenset(util.ALPHA_NUM.decode("ascii"))
+
+Chunk = namedtuple("Chunk", ["id", "index", "count", "crc", "body"])
+
+
+def _crc(payload):
+    return f"{zlib.crc32(payload.encode('utf-8')):08X}"
+
+
+def _sequence_id(payload):
+    # Deterministic, so regenerating a profile gives the same codes (and cache hits)
+    value = zlib.adler32(payload.encode("utf-8")) % 36 ** 4
+    digits = []
+    for _ in range(4):
+        value, digit = divmod(value, 36)
+        digits.append(_BASE36[digit])
+    return "".join(reversed(digits))
+
+
+def _header(sequence_id, index, count, crc):
+    return f"{PREFIX}{sequence_id}:{index}:{count}:{crc}:"
+
+
+def _error_correction(encode_profile):
+    from qr_encode import ERROR_CORRECTION_LEVELS, QR_ERROR_CORRECTION
+
+    # robust can pick any level up to the highest, so its chunks are sized for that one
+    return ERROR_CORRECTION_LEVELS[0] if encode_profile == "robust" else QR_ERROR_CORRECTION
+
+
+def _fits(length, mode, max_version, error_correction):
+    from qr_encode import fixed_version
+
+    try:
+        return fixed_version(length, mode, error_correction) <= max_version
+    except qrcode.exceptions.DataOverflowError:
+        return False
+
+
+def _capacity(header_length, mode, max_version, error_correction):
+    """
+    Largest body length (characters, or UTF-8 bytes in byte mode) that fits behind a header.
+    """
+    low, high = 0, 3000
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _fits(header_length + middle, mode, max_version, error_correction):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _pieces(payload, capacity, byte_mode):
+    if not byte_mode:
+        return [payload[start:start + capacity] for start in range(0, len(payload), capacity)]
+    # Split on characters so no UTF-8 sequence is cut in half
+    pieces, current, size = [], [], 0
+    for character in payload:
+        width = len(character.encode("utf-8"))
+        if size + width > capacity and current:
+            pieces.append("".join(current))
+            current, size = [], 0
+        current.append(character)
+        size += width
+    pieces.append("".join(current))
+    return pieces
+
+
+def split(payload, max_version=DEFAULT_MAX_VERSION, encode_profile=None):
+    """
+    The payload as a list of chunk texts that each fit a version `max_version`
+    code when rendered with `encode_profile` (see qr_encode.build_qr).
+
+    A payload that already fits is returned unchanged as a single item, so
+    small profiles keep scanning everywhere.
+    """
+    error_correction = _error_correction(encode_profile)
+    byte_mode = not set(payload) <= _ALPHANUMERIC
+    mode = util.MODE_8BIT_BYTE if byte_mode else util.MODE_ALPHA_NUM
+    size = len(payload.encode("utf-8")) if byte_mode else len(payload)
+    if _fits(size, mode, max_version, error_correction):
+        return [payload]
+
+    sequence_id, crc = _sequence_id(payload), _crc(payload)
+    # Widest header for a two-digit index and count
+    capacity = _capacity(len(_header(sequence_id, MAX_CHUNKS, MAX_CHUNKS, crc)), mode, max_version, error_correction)
+    if capacity < 1:
+        raise ValueError(f"QR version {max_version} is too small for a chunk header")
+    pieces = _pieces(payload, capacity, byte_mode)
+    if len(pieces) > MAX_CHUNKS:
+        raise ValueError(f"Payload needs {len(pieces)} chunks at version {max_version}; the limit is {MAX_CHUNKS}")
+    return [_header(sequence_id, index, len(pieces), crc) + piece for index, piece in enumerate(pieces, 1)]
+
+
+def is_chunk(text):
+    return text.startswith(PREFIX)
+
+
+def parse_chunk(text):
+    """
+    Returns a Chunk for a chunk text, or None for anything else (including malformed headers).
+    """
+    if not is_chunk(text):
+        return None
+    parts = text[len(PREFIX):].split(":", 4)
+    if len(parts) != 5:
+        return None
+    sequence_id, index, count, crc, body = parts
+    if not (index.isdigit() and count.isdigit()):
+        return None
+    index, count = int(index), int(count)
+    if not 1 <= index <= count <= MAX_CHUNKS:
+        return None
+    return Chunk(sequence_id, index, count, crc, body)
+
+
+def part_filename(filename, index, count):
+    """
+    "name_qr.png" -> "name_qr_2of5.png"; unchanged for a single code.
+    """
+    if count == 1:
+        return filename
+    root, extension = os.path.splitext(filename)
+    return f"{root}_{index}of{count}{extension}"
+
+
+class Reassembler:
+    """
+    Collects chunks in any order and returns each payload once it is complete.
+
+    At most `max_pending` incomplete sequences are kept (the least recently
+    updated is evicted first), and a sequence with no new chunk for `ttl`
+    seconds is dropped. Chunks of a sequence completed within the last `ttl`
+    seconds are ignored, so codes still in view aren't reported twice.
+    Thread-safe.
+    """
+
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.clock = clock
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.corrupt = 0
+        self._pending = OrderedDict()
+        self._done = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        """
+        Feeds one decoded text. Returns the full payload when `text` completes a
+        sequence, `text` itself when it isn't a chunk, and None otherwise.
+        """
+        chunk = parse_chunk(text)
+        if chunk is None:
+            return None if is_chunk(text) else text
+        now = self.clock()
+        key = (chunk.id, chunk.count, chunk.crc)
+        with self._lock:
+            self._expire(now)
+            if key in self._done:
+                self._done[key] = now
+                self._done.move_to_end(key)
+                return None
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = {"parts": {}, "updated": now}
+                while len(self._pending) > self.max_pending:
+                    self._pending.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._pending.move_to_end(key)
+            entry["parts"][chunk.index] = chunk.body
+            entry["updated"] = now
+            if len(entry["parts"]) < chunk.count:
+                return None
+            del self._pending[key]
+        payload = "".join(entry["parts"][index] for index in range(1, chunk.count + 1))
+        if _crc(payload) != chunk.crc:
+            self.corrupt += 1
+            return None
+        with self._lock:
+            self._done[key] = now
+            while len(self._done) > self.max_pending:
+                self._done.popitem(last=False)
+            self.completed += 1
+        return payload
+
+    def _expire(self, now):
+        while self._pending:
+            key, entry = next(iter(self._pending.items()))
+            if now - entry["updated"] < self.ttl:
+                break
+            del self._pending[key]
+            self.expired += 1
+        while self._done and now - next(iter(self._done.values())) >= self.ttl:
+            self._done.popitem(last=False)
+
+    def progress(self):
+        """
+        (sequence id, chunks received, chunk count) for each incomplete sequence.
+        """
+        with self._lock:
+            self._expire(self.clock())
+            return [(key[0], len(entry["parts"]), key[1]) for key, entry in self._pending.items()]
+
+    def summary(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "completed": self.completed,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "corrupt": self.corrupt,
+            }
+
+
+def main(argv=None):
+    import profile_codec
+    from qr_encode import DEFAULT_ENCODE_PROFILE, ENCODE_PROFILES, save_qr_png
+
+    parser = argparse.ArgumentParser(description="Write a profile as a sequence of small QR codes.")
+    parser.add_argument("profile", help="Profile JSON file")
+    parser.add_argument("out_dir", help="Directory to write the PNG files to")
+    parser.add_argument("--max-version", type=int, default=DEFAULT_MAX_VERSION, help="Largest QR version per code")
+    parser.add_argument("--compact", action="store_true", help="Use the compact profile payload format")
+    parser.add_argument("--encode-profile", choices=ENCODE_PROFILES, default=DEFAULT_ENCODE_PROFILE,
+                        help="QR encode profile (robust gets smaller chunks for its higher error correction)")
+    args = parser.parse_args(argv)
+
+    with open(args.profile, "r") as json_file:
+        profile = json.load(json_file)
+    parts = split(profile_codec.dumps(profile, args.compact), args.max_version, args.encode_profile)
+    filename = os.path.splitext(os.path.basename(args.profile))[0] + "_qr.png"
+    for index, part in enumerate(parts, 1):
+        path = save_qr_png(part, os.path.join(args.out_dir, part_filename(filename, index, len(parts))),
+                           args.encode_profile)
+        print(json.dumps({"path": path, "chars": len(part)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
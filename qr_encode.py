@@ -0,0 +1,199 @@
+import os
+from bisect import bisect_left
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+from qrcode import util
+
+from instrumentation import stage
+from qr_render import png_bytes
+
+# Directory the apps save profiles, QR codes and caches under
+SAVE_DIR = "saved_data"
+
+# QRCode settings shared by the Streamlit generators and the batch engine
+QR_VERSION = 1
+QR_ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_L
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+
+# Encode profiles:
+#   default     best-fit version and the best of all eight masks (the original behaviour)
+#   throughput  single-segment payload, version from a memoized capacity table and a pinned mask
+#   robust      the highest error-correction level that still prints legibly at print_size_mm
+ENCODE_PROFILES = ("default", "throughput", "robust")
+DEFAULT_ENCODE_PROFILE = "default"
+THROUGHPUT_MASK_PATTERN = 0
+DEFAULT_PRINT_SIZE_MM = 40.0
+# Smallest module most phone cameras resolve reliably at arm's length
+MIN_MODULE_MM = 0.5
+
+ERROR_CORRECTION_LEVELS = (
+    qrcode.constants.ERROR_CORRECT_H,
+    qrcode.constants.ERROR_CORRECT_Q,
+    qrcode.constants.ERROR_CORRECT_M,
+    qrcode.constants.ERROR_CORRECT_L,
+)
+
+_NUMERIC = frozenset("0123456789")
+_ALPHANUMERIC = frozenset(util.ALPHA_NUM.decode("ascii"))
+
+
+def qr_params():
+    """
+    Returns the QRCode parameters that determine the rendered image.
+    """
+    return {
+        "version": QR_VERSION,
+        "error_correction": QR_ERROR_CORRECTION,
+        "box_size": QR_BOX_SIZE,
+        "border": QR_BORDER,
+    }
+
+
+def encode_params(profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
+    """
+    qr_params() plus the encode profile, for cache keys. The default profile keeps the old keys.
+    """
+    params = qr_params()
+    if profile != DEFAULT_ENCODE_PROFILE:
+        params["profile"] = profile
+    if profile == "robust":
+        params["print_size_mm"] = float(print_size_mm)
+    return params
+
+
+def _segment(data):
+    """
+    The payload as one QR segment in the densest mode that covers all of it.
+    """
+    if isinstance(data, str):
+        characters = set(data)
+        if characters <= _NUMERIC and data:
+            return util.QRData(data, util.MODE_NUMBER)
+        if characters <= _ALPHANUMERIC:
+            return util.QRData(data, util.MODE_ALPHA_NUM)
+    return util.QRData(data, util.MODE_8BIT_BYTE)
+
+
+def _data_bits(mode, length):
+    if mode == util.MODE_NUMBER:
+        return 10 * (length // 3) + util.NUMBER_LENGTH.get(length % 3, 0)
+    if mode == util.MODE_ALPHA_NUM:
+        return 11 * (length // 2) + 6 * (length % 2)
+    return 8 * length
+
+
+@lru_cache(maxsize=4096)
+def fixed_version(length, mode, error_correction):
+    """
+    Smallest version holding a single `mode` segment of `length` characters.
+    """
+    limits = util.BIT_LIMIT_TABLE[error_correction]
+    version = 1
+    while version <= 40:
+        needed = 4 + util.length_in_bits(mode, version) + _data_bits(mode, length)
+        fitting = bisect_left(limits, needed, version)
+        if fitting > 40:
+            break
+        # The length field grows at versions 10 and 27; re-check with the version found
+        if util.length_in_bits(mode, fitting) == util.length_in_bits(mode, version):
+            return fitting
+        version = fitting
+    raise qrcode.exceptions.DataOverflowError()
+
+
+def robust_error_correction(segment, print_size_mm=DEFAULT_PRINT_SIZE_MM):
+    """
+    Highest error-correction level whose version keeps modules at least MIN_MODULE_MM wide
+    when printed `print_size_mm` across (border included). Falls back to the lowest level.
+    """
+    for error_correction in ERROR_CORRECTION_LEVELS:
+        try:
+            version = fixed_version(len(segment), segment.mode, error_correction)
+        except qrcode.exceptions.DataOverflowError:
+            continue
+        modules = version * 4 + 17 + 2 * QR_BORDER
+        if print_size_mm / modules >= MIN_MODULE_MM:
+            return error_correction, version
+    return ERROR_CORRECTION_LEVELS[-1], fixed_version(len(segment), segment.mode, ERROR_CORRECTION_LEVELS[-1])
+
+
+def build_qr(data, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
+    """
+    Builds the QR matrix for the given payload using the shared settings and an encode profile.
+    """
+    if profile == DEFAULT_ENCODE_PROFILE:
+        qr = qrcode.QRCode(**qr_params())
+        with stage("qr.make"):
+            qr.add_data(data)
+            qr.make(fit=True)
+        return qr
+    if profile not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown encode profile {profile!r}; expected one of {', '.join(ENCODE_PROFILES)}")
+
+    segment = _segment(data)
+    if profile == "throughput":
+        error_correction = QR_ERROR_CORRECTION
+        version = fixed_version(len(segment), segment.mode, error_correction)
+        mask_pattern = THROUGHPUT_MASK_PATTERN
+    else:
+        error_correction, version = robust_error_correction(segment, print_size_mm)
+        mask_pattern = None
+    qr = qrcode.QRCode(version=version, error_correction=error_correction, box_size=QR_BOX_SIZE,
+                       border=QR_BORDER, mask_pattern=mask_pattern)
+    with stage("qr.make"):
+        qr.add_data(segment)
+        qr.make(fit=False)
+    return qr
+
+
+def make_qr_image(data, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
+    qr = build_qr(data, profile, print_size_mm)
+    with stage("qr.make_image"):
+        return qr.make_image(fill_color="black", back_color="white")
+
+
+def encode_profile_sidebar():
+    """
+    Streamlit sidebar controls for the encode profile; returns (profile, print_size_mm).
+    """
+    import streamlit as st
+
+    profile = st.sidebar.selectbox("Encode profile", ENCODE_PROFILES, key="qrdna_encode_profile",
+                                   help="throughput: fastest encoding; robust: most error correction "
+                                        "that still scans at the chosen print size")
+    print_size_mm = DEFAULT_PRINT_SIZE_MM
+    if profile == "robust":
+        print_size_mm = st.sidebar.number_input("Print size (mm)", min_value=10.0, max_value=500.0,
+                                                value=DEFAULT_PRINT_SIZE_MM, step=5.0, key="qrdna_print_size")
+    return profile, print_size_mm
+
+
+def pil_png_bytes(data):
+    """
+    PNG through qr.make_image and PIL, the reference for qr_render's output.
+    """
+    img = make_qr_image(data)
+    buffered = BytesIO()
+    with stage("png.save"):
+        img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def qr_png_bytes(data, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
+    """
+    PNG of the QR code rendered straight from the module matrix (pixel-identical to pil_png_bytes).
+    """
+    qr = build_qr(data, profile, print_size_mm)
+    with stage("png.render"):
+        return png_bytes(qr.get_matrix(), QR_BOX_SIZE)
+
+
+def save_qr_png(data, filepath, profile=DEFAULT_ENCODE_PROFILE, print_size_mm=DEFAULT_PRINT_SIZE_MM):
+    png = qr_png_bytes(data, profile, print_size_mm)
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    with open(filepath, "wb") as png_file:
+        png_file.write(png)
+    return filepath
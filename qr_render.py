@@ -0,0 +1,126 @@
+"""
+Vectorized QR rendering straight from the module matrix.
+
+qr.make_image() draws every dark module as a PIL rectangle before the PNG
+encoder runs. Here the matrix from qr.get_matrix() (border included) is
+expanded with NumPy and written as a 1-bit grayscale PNG. That is the same
+format PIL writes for the black/white "1"-mode images, so decoded pixels
+are identical. SVG and plain matrix outputs are included for clients that
+draw codes themselves.
+
+    python qr_render.py "some payload" -o code.png
+    python qr_render.py "some payload" -o code.svg
+"""
+import argparse
+import struct
+import sys
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# zlib level used by PIL's PNG encoder by default
+PNG_COMPRESS_LEVEL = 6
+
+
+def _chunk(kind, payload):
+    return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+
+def png_bytes(matrix, box_size=10, compress_level=PNG_COMPRESS_LEVEL):
+    """
+    1-bit grayscale PNG of `matrix`, each module `box_size` pixels square.
+    """
+    import numpy as np
+
+    # get_matrix() marks dark modules True; a set bit is white in a 1-bit grayscale PNG
+    white = ~np.asarray(matrix, dtype=bool)
+    size = white.shape[0] * box_size
+    # Rows within one module row are identical: pack one scanline per module row, then repeat it
+    scanlines = np.packbits(np.repeat(white, box_size, axis=1), axis=1)
+    scanlines = np.hstack([np.zeros((scanlines.shape[0], 1), dtype=np.uint8), scanlines])  # filter type 0
+    raw = np.repeat(scanlines, box_size, axis=0).tobytes()
+    return b"".join((
+        PNG_SIGNATURE,
+        _chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 1, 0, 0, 0, 0)),
+        _chunk(b"IDAT", zlib.compress(raw, compress_level)),
+        _chunk(b"IEND", b""),
+    ))
+
+
+def svg_text(matrix, box_size=10):
+    """
+    SVG with one path for all dark modules; horizontal runs are merged into single rects.
+    """
+    import numpy as np
+
+    dark = np.asarray(matrix, dtype=bool)
+    count = dark.shape[0]
+    commands = []
+    for y, row in enumerate(dark):
+        padded = np.concatenate(([False], row, [False])).astype(np.int8)
+        edges = np.flatnonzero(np.diff(padded))
+        for start, end in zip(edges[::2], edges[1::2]):
+            commands.append(f"M{start} {y}h{end - start}v1h-{end - start}z")
+    size = count * box_size
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {count} {count}" shape-rendering="crispEdges">'
+        f'<rect width="{count}" height="{count}" fill="white"/>'
+        f'<path d="{"".join(commands)}" fill="black"/></svg>'
+    )
+
+
+def matrix_text(matrix):
+    """
+    One line per module row, "1" for dark and "0" for light modules.
+    """
+    return "\n".join("".join("1" if module else "0" for module in row) for row in matrix) + "\n"
+
+
+def matrix_list(matrix):
+    """
+    The matrix as nested lists of 0/1, ready for JSON.
+    """
+    return [[1 if module else 0 for module in row] for row in matrix]
+
+
+def render(matrix, fmt, box_size=10):
+    """
+    Renders to "png" (bytes), "svg" or "matrix" (text).
+    """
+    if fmt == "png":
+        return png_bytes(matrix, box_size)
+    if fmt == "svg":
+        return svg_text(matrix, box_size)
+    if fmt == "matrix":
+        return matrix_text(matrix)
+    raise ValueError(f"Unknown QR output format {fmt!r}")
+
+
+def main(argv=None):
+    from qr_encode import QR_BOX_SIZE, build_qr
+
+    parser = argparse.ArgumentParser(description="Render a QR code as PNG, SVG or a raw module matrix.")
+    parser.add_argument("data", help="Payload to encode ('-' reads stdin)")
+    parser.add_argument("-o", "--output", help="Output file; the format follows the extension (.png, .svg, .txt)")
+    parser.add_argument("--format", choices=["png", "svg", "matrix"], help="Output format (default: from --output)")
+    args = parser.parse_args(argv)
+
+    data = sys.stdin.read() if args.data == "-" else args.data
+    fmt = args.format
+    if fmt is None:
+        extension = (args.output or "").rsplit(".", 1)[-1].lower()
+        fmt = {"png": "png", "svg": "svg"}.get(extension, "matrix")
+    output = render(build_qr(data).get_matrix(), fmt, QR_BOX_SIZE)
+    if args.output:
+        with open(args.output, "wb" if fmt == "png" else "w") as output_file:
+            output_file.write(output)
+    elif fmt == "png":
+        sys.stdout.buffer.write(output)
+    else:
+        sys.stdout.write(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
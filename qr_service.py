@@ -0,0 +1,514 @@
+"""
+Headless HTTP service for encode, decode and compare, next to the Streamlit UI.
+
+Plain asyncio (no extra dependencies). CPU-bound encode/decode requests
+are grouped into micro-batches and run in a process pool; when too many
+requests are in flight new ones get 503 with Retry-After instead of
+queueing without bound.
+
+    python qr_service.py serve --port 8502 --workers 4
+    python qr_service.py loadtest --endpoint encode --concurrency 32 --requests 2000
+
+Endpoints:
+    POST /encode    {"profile": {...}, "compact": false} or {"data": "text"} -> image/png
+                    ("format": "svg" or "matrix" for SVG or a 0/1 module matrix,
+                     "encode_profile": "throughput" or "robust", "print_size_mm": 40)
+    POST /decode    raw image bytes -> {"symbols": [...]}
+    POST /compare   {"profile1": {...}, "profile2": {...}} -> similarity scores
+                    {"profile": {...}, "top_k": 5}          -> closest stored profiles
+    GET  /health    liveness and load
+    GET  /metrics   Prometheus text format
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import prometheus_text
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+ENCODE_FORMATS = {"png": "image/png", "svg": "image/svg+xml", "matrix": "text/plain"}
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or STATUS_TEXT.get(status, ""))
+        self.status = status
+
+
+# Worker-side batch functions (must be importable by the process pool). Each returns one
+# (status, value) per item: 200 with the result, or 400/500 with an error message.
+def encode_many(requests):
+    import qrcode
+
+    import profile_codec
+    from qr_encode import DEFAULT_ENCODE_PROFILE, DEFAULT_PRINT_SIZE_MM, QR_BOX_SIZE, build_qr
+    from qr_render import render
+
+    results = []
+    for request in requests:
+        try:
+            if "profile" in request:
+                payload = profile_codec.dumps(request["profile"], request.get("compact", False), request.get("indent"))
+            else:
+                payload = str(request["data"])
+            qr = build_qr(payload, request.get("encode_profile", DEFAULT_ENCODE_PROFILE),
+                          float(request.get("print_size_mm", DEFAULT_PRINT_SIZE_MM)))
+            output = render(qr.get_matrix(), request.get("format", "png"), QR_BOX_SIZE)
+            results.append((200, output if isinstance(output, bytes) else output.encode("utf-8")))
+        except (ValueError, TypeError, KeyError, qrcode.exceptions.DataOverflowError) as e:
+            # Bad field values, or a payload too large for any QR version
+            results.append((400, f"{type(e).__name__}: {e}"))
+        except Exception as e:
+            results.append((500, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def decode_many(images):
+    from io import BytesIO
+
+    from PIL import Image
+
+    from bulk_decode import decode_all_symbols
+
+    results = []
+    for image in images:
+        try:
+            opened = Image.open(BytesIO(image))
+            opened.load()
+        except Exception as e:
+            # PIL raises several types (UnidentifiedImageError, OSError, SyntaxError...) for bad uploads
+            results.append((400, f"Unreadable image: {type(e).__name__}: {e}"))
+            continue
+        try:
+            results.append((200, decode_all_symbols(opened)))
+        except Exception as e:
+            results.append((500, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def compare_pair(profile1, profile2):
+    # Runs on the thread executor: the vectorizer's first use imports NumPy and SciPy
+    from profile_vectors import get_default_vectorizer
+    from similarity import profile_similarity
+
+    return {
+        "similarity": profile_similarity(profile1, profile2),
+        "ai_similarity": float(get_default_vectorizer().similarity_matrix([profile1], [profile2])[0][0]),
+    }
+
+
+class MicroBatcher:
+    """
+    Collects concurrent submissions for up to `max_delay` seconds (or `max_batch` items)
+    and runs them as one call of `batch_func` in `executor`.
+    """
+
+    def __init__(self, executor, batch_func, max_batch=32, max_delay=0.002, metrics=None, name="batch"):
+        self.executor = executor
+        self.batch_func = batch_func
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self.name = name
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        status, value = await future
+        if status != 200:
+            raise HTTPError(status, value)
+        return value
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self.metrics:
+            self.metrics.observe_batch(self.name, len(batch))
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self.executor, self.batch_func, [item for item, _ in batch])
+
+        def distribute(done):
+            try:
+                results = done.result()
+            except Exception as e:
+                # The executor failed (e.g. BrokenProcessPool), not the request
+                results = [(500, f"{type(e).__name__}: {e}")] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+        task.add_done_callback(distribute)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class Metrics:
+    """
+    Request counters, latency windows and batch sizes per endpoint.
+    """
+
+    def __init__(self, window=2000):
+        self.started = time.time()
+        self.window = window
+        self.requests = {}
+        self.errors = {}
+        self.rejected = 0
+        self.latencies = {}
+        self.batches = {}
+        self.batch_items = {}
+
+    def observe(self, endpoint, status, latency):
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        if status >= 400:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        self.latencies.setdefault(endpoint, deque(maxlen=self.window)).append(latency)
+
+    def observe_batch(self, name, size):
+        self.batches[name] = self.batches.get(name, 0) + 1
+        self.batch_items[name] = self.batch_items.get(name, 0) + size
+
+    def prometheus(self, inflight):
+        lines = [
+            "# TYPE qrdna_uptime_seconds gauge",
+            f"qrdna_uptime_seconds {time.time() - self.started:.3f}",
+            "# TYPE qrdna_inflight_requests gauge",
+            f"qrdna_inflight_requests {inflight}",
+            "# TYPE qrdna_rejected_total counter",
+            f"qrdna_rejected_total {self.rejected}",
+            "# TYPE qrdna_requests_total counter",
+        ]
+        lines += [f'qrdna_requests_total{{endpoint="{e}"}} {n}' for e, n in sorted(self.requests.items())]
+        lines.append("# TYPE qrdna_errors_total counter")
+        lines += [f'qrdna_errors_total{{endpoint="{e}"}} {n}' for e, n in sorted(self.errors.items())]
+        lines.append("# TYPE qrdna_request_seconds summary")
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples = list(samples)
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(f'qrdna_request_seconds{{endpoint="{endpoint}",quantile="{quantile}"}} '
+                             f"{_percentile(samples, quantile * 100):.6f}")
+        lines.append("# TYPE qrdna_batches_total counter")
+        lines += [f'qrdna_batches_total{{batcher="{b}"}} {n}' for b, n in sorted(self.batches.items())]
+        lines.append("# TYPE qrdna_batch_items_total counter")
+        lines += [f'qrdna_batch_items_total{{batcher="{b}"}} {n}' for b, n in sorted(self.batch_items.items())]
+        return "\n".join(lines) + "\n"
+
+
+class QRService:
+    def __init__(self, workers=None, max_inflight=256, max_batch=32, max_delay=0.002):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_inflight = max_inflight
+        self.metrics = Metrics()
+        self.inflight = 0
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.encoder = MicroBatcher(self.pool, encode_many, max_batch, max_delay, self.metrics, "encode")
+        self.decoder = MicroBatcher(self.pool, decode_many, max_batch, max_delay, self.metrics, "decode")
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    async def dispatch(self, method, path, body):
+        """
+        Returns (status, content_type, payload bytes) for one request.
+        """
+        routes = {
+            "/encode": ("POST", self.encode),
+            "/decode": ("POST", self.decode),
+            "/compare": ("POST", self.compare),
+            "/health": ("GET", self.health),
+            "/metrics": ("GET", self.prometheus),
+        }
+        if path not in routes:
+            raise HTTPError(404)
+        expected, handler = routes[path]
+        if method != expected:
+            raise HTTPError(405)
+        if expected == "GET":
+            return await handler()
+        if self.inflight >= self.max_inflight:
+            self.metrics.rejected += 1
+            raise HTTPError(503, "Server is at capacity, retry shortly")
+        self.inflight += 1
+        try:
+            return await handler(body)
+        finally:
+            self.inflight -= 1
+
+    @staticmethod
+    def _profile(request, key):
+        """
+        request[key] checked as a profile: a JSON object whose list fields hold only strings.
+        """
+        from similarity import LIST_FIELDS, flatten_profile
+
+        profile = request[key]
+        if not isinstance(profile, dict):
+            raise HTTPError(400, f"'{key}' must be a JSON object")
+        for field, value in flatten_profile(profile).items():
+            if isinstance(value, list) or field in LIST_FIELDS:
+                if not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+                    raise HTTPError(400, f"'{key}.{field}' must be a list of strings")
+        return profile
+
+    @staticmethod
+    def _json_body(body):
+        try:
+            request = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON") from None
+        if not isinstance(request, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return request
+
+    async def encode(self, body):
+        request = self._json_body(body)
+        if "profile" not in request and "data" not in request:
+            raise HTTPError(400, "Expected 'profile' or 'data'")
+        content_type = ENCODE_FORMATS.get(request.get("format", "png"))
+        if content_type is None:
+            raise HTTPError(400, f"'format' must be one of {', '.join(ENCODE_FORMATS)}")
+        return 200, content_type, await self.encoder.submit(request)
+
+    async def decode(self, body):
+        if not body:
+            raise HTTPError(400, "Expected image bytes")
+        symbols = await self.decoder.submit(body)
+        return 200, "application/json", json.dumps({"symbols": symbols}).encode()
+
+    async def compare(self, body):
+        request = self._json_body(body)
+        loop = asyncio.get_running_loop()
+        if "profile1" in request and "profile2" in request:
+            profile1, profile2 = self._profile(request, "profile1"), self._profile(request, "profile2")
+            result = await loop.run_in_executor(None, compare_pair, profile1, profile2)
+        elif "profile" in request:
+            from profile_index import get_default_index
+
+            profile = self._profile(request, "profile")
+            try:
+                k = int(request.get("top_k", 5))
+            except (TypeError, ValueError):
+                raise HTTPError(400, "'top_k' must be an integer") from None
+            # The first call builds the index from the store, so that runs off the event loop too
+            matches = await loop.run_in_executor(None, lambda: get_default_index().top_k(profile, k))
+            result = {"matches": [{"id": key, "score": score} for key, score in matches]}
+        else:
+            raise HTTPError(400, "Expected 'profile1' and 'profile2', or 'profile'")
+        return 200, "application/json", json.dumps(result).encode()
+
+    async def health(self):
+        status = {"status": "ok", "inflight": self.inflight, "max_inflight": self.max_inflight, "workers": self.workers}
+        return 200, "application/json", json.dumps(status).encode()
+
+    async def prometheus(self):
+        text = self.metrics.prometheus(self.inflight) + prometheus_text()
+        return 200, "text/plain; version=0.0.4", text.encode()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, "application/json", b'{"error": "Headers too large"}', False)
+                    return
+
+                started = time.perf_counter()
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, "application/json", b'{"error": "Bad request line"}', False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                path = target.split("?", 1)[0]
+
+                length = headers.get("content-length", "0") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await self._respond(writer, 400, "application/json", b'{"error": "Bad Content-Length"}', False)
+                    return
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, "application/json", b'{"error": "Body too large"}', False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, content_type, payload = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    status, content_type = e.status, "application/json"
+                    payload = json.dumps({"error": str(e)}).encode()
+                except Exception as e:
+                    status, content_type = 500, "application/json"
+                    payload = json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+                self.metrics.observe(path, status, time.perf_counter() - started)
+                await self._respond(writer, status, content_type, payload, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, content_type, payload, keep_alive):
+        head = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(payload)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+
+
+async def serve(host, port, **options):
+    service = QRService(**options)
+    server = await asyncio.start_server(service.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+    print(f"QR service listening on http://{host}:{port} with {service.workers} workers", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+# Load testing
+async def _client(host, port, method, path, body, count, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = (f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            length = next((int(line.split(":", 1)[1]) for line in lines if line.lower().startswith("content-length")), 0)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            status = int(lines[0].split(" ")[1])
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+def _loadtest_body(endpoint, image_path):
+    profile = {
+        "name": "Sreelesh",
+        "age": 30,
+        "email": "aikunnath@example.com",
+        "phone": "+1234567890",
+        "address": "Prendener Str.12, Berlin, Germany",
+        "hobbies": ["reading", "traveling"],
+        "tastes": ["spicy", "savory"],
+        "skills": ["programming", "data analysis"],
+        "preferences": ["outdoor activities", "coffee"],
+    }
+    if endpoint == "encode":
+        return json.dumps({"profile": profile}).encode()
+    if endpoint == "compare":
+        return json.dumps({"profile1": profile, "profile2": dict(profile, name="Sree")}).encode()
+    if image_path:
+        with open(image_path, "rb") as image_file:
+            return image_file.read()
+    from qr_encode import qr_png_bytes
+    return qr_png_bytes(json.dumps(profile))
+
+
+async def loadtest(host, port, endpoint, concurrency, requests, image_path=None):
+    body = _loadtest_body(endpoint, image_path)
+    latencies, statuses = [], {}
+    concurrency = max(1, min(concurrency, requests))
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, "POST", f"/{endpoint}", body, requests // concurrency + (i < requests % concurrency),
+                latencies, statuses)
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "latency_p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "latency_p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "latency_p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless QR encode/decode/compare service.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Run the HTTP service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8502)
+    serve_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    serve_parser.add_argument("--max-inflight", type=int, default=256, help="Requests in flight before 503")
+    serve_parser.add_argument("--max-batch", type=int, default=32, help="Largest micro-batch sent to a worker")
+    serve_parser.add_argument("--batch-delay-ms", type=float, default=2.0, help="How long to wait to fill a batch")
+    load_parser = commands.add_parser("loadtest", help="Load-test a running service")
+    load_parser.add_argument("--host", default="127.0.0.1")
+    load_parser.add_argument("--port", type=int, default=8502)
+    load_parser.add_argument("--endpoint", choices=["encode", "decode", "compare"], default="encode")
+    load_parser.add_argument("--concurrency", type=int, default=32)
+    load_parser.add_argument("--requests", type=int, default=2000)
+    load_parser.add_argument("--image", help="Image to send to /decode (default: a generated QR code)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, workers=args.workers, max_inflight=args.max_inflight,
+                              max_batch=args.max_batch, max_delay=args.batch_delay_ms / 1000))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    report = asyncio.run(loadtest(args.host, args.port, args.endpoint, args.concurrency, args.requests, args.image))
+    print(json.dumps(report))
+    return 0 if set(report["statuses"]) <= {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+"""
+Producer/consumer pipeline for live QR scanning.
+
+A capture thread reads frames from any cv2.VideoCapture source (camera
+index, video file or stream URL) into a small ring buffer that drops stale
+frames. Decode workers always take the newest frame, so latency stays flat
+when decoding is slower than the camera.
+
+    python scan_pipeline.py 0
+    python scan_pipeline.py recording.mp4 --workers 2
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+from decoders import Point, Rect, Symbol, get_default_decoder
+from instrumentation import stage, summary as stage_summary
+
+ScanResult = namedtuple("ScanResult", ["data", "polygon", "rect", "frame_index", "latency"])
+
+
+def transform_symbol(obj, scale=1.0, offset_x=0, offset_y=0):
+    """
+    Maps a symbol found in a scaled/cropped image back to full-frame coordinates.
+    """
+    polygon = [Point(int(round(p.x * scale)) + offset_x, int(round(p.y * scale)) + offset_y) for p in obj.polygon]
+    rect = Rect(int(round(obj.rect.left * scale)) + offset_x, int(round(obj.rect.top * scale)) + offset_y,
+                int(round(obj.rect.width * scale)), int(round(obj.rect.height * scale)))
+    return Symbol(obj.data, getattr(obj, "type", "QRCODE"), rect, polygon)
+
+
+class RoiDecoder:
+    """
+    Fast-path decoder: finds codes on a downscaled grayscale frame, then tracks them.
+
+    Once a code is found, later frames decode only the region around its
+    last polygon at full resolution. After `max_misses` misses in a row the
+    region is dropped and the next frame is rescanned downscaled. Frames
+    where the downscaled pass finds nothing get a full-resolution pass every
+    `full_res_every` frames so small codes are still picked up.
+
+    ScanPipeline's workers share one instance per camera: the region and
+    counters are only touched under a lock (decoding runs outside it), and
+    calls are numbered so a worker finishing an older frame late can't
+    replace the region found in a newer one.
+    """
+
+    def __init__(self, decoder=None, scale=0.5, max_misses=5, margin=0.3, full_res_every=10):
+        self.decoder = decoder or get_default_decoder()
+        self.scale = scale
+        self.max_misses = max_misses
+        self.margin = margin
+        self.full_res_every = full_res_every
+        self.roi_hits = 0
+        self.rescans = 0
+        self._roi = None
+        self._roi_call = -1
+        self._misses = 0
+        self._empty_scans = 0
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def _track(self, symbols, frame_shape, call):
+        xs = [p.x for obj in symbols for p in obj.polygon]
+        ys = [p.y for obj in symbols for p in obj.polygon]
+        pad_x = int((max(xs) - min(xs)) * self.margin) + 8
+        pad_y = int((max(ys) - min(ys)) * self.margin) + 8
+        height, width = frame_shape[:2]
+        with self._lock:
+            self._empty_scans = 0
+            if call < self._roi_call:
+                return
+            self._roi = (max(0, min(xs) - pad_x), max(0, min(ys) - pad_y),
+                         min(width, max(xs) + pad_x), min(height, max(ys) + pad_y))
+            self._roi_call = call
+            self._misses = 0
+
+    def reset(self):
+        with self._lock:
+            self._roi = None
+            self._misses = 0
+
+    def __call__(self, frame):
+        import cv2
+
+        if frame.ndim == 2:
+            gray = frame
+        else:
+            with stage("cv2.cvtColor"):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        with self._lock:
+            call = self._calls
+            self._calls += 1
+            roi = self._roi
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            symbols = [transform_symbol(obj, 1.0, x0, y0) for obj in self.decoder(gray[y0:y1, x0:x1])]
+            if symbols:
+                with self._lock:
+                    self.roi_hits += 1
+                self._track(symbols, gray.shape, call)
+                return symbols
+            with self._lock:
+                self._misses += 1
+                if self._misses < self.max_misses:
+                    return []
+                if self._roi == roi:
+                    self._roi = None
+
+        with self._lock:
+            self.rescans += 1
+        if self.scale < 1.0:
+            small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            symbols = [transform_symbol(obj, 1.0 / self.scale) for obj in self.decoder(small)]
+        else:
+            symbols = []
+        if not symbols:
+            with self._lock:
+                self._empty_scans += 1
+                full_res = self.scale >= 1.0 or (self.full_res_every and self._empty_scans % self.full_res_every == 0)
+            if full_res:
+                symbols = [transform_symbol(obj) for obj in self.decoder(gray)]
+        if symbols:
+            self._track(symbols, gray.shape, call)
+        return symbols
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class FrameRing:
+    """
+    Small ring buffer of (frame_index, captured_at, frame) that always hands out the newest frame.
+    """
+
+    def __init__(self, size=2):
+        self._frames = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self._cond:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append(item)
+            self._cond.notify()
+
+    def take_newest(self, timeout=None):
+        """
+        Returns the newest frame and discards the older ones, or None on timeout/close.
+        """
+        with self._cond:
+            if not self._frames and not self.closed:
+                self._cond.wait(timeout)
+            if not self._frames:
+                return None
+            item = self._frames.pop()
+            self.dropped += len(self._frames)
+            self._frames.clear()
+            return item
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class ScanStats:
+    """
+    Counters and per-frame latency samples for a running pipeline.
+    """
+
+    def __init__(self, window=1000):
+        self.started = time.perf_counter()
+        self.captured = 0
+        self.throttled = 0
+        self.decoded_frames = 0
+        self.results = 0
+        self.results_dropped = 0
+        self.decode_errors = 0
+        self.last_error = None
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_frame(self, latency, found):
+        with self._lock:
+            self.decoded_frames += 1
+            self.results += found
+            self.latencies.append(latency)
+
+    def record_error(self, error):
+        """
+        Counts a frame whose decode raised; only the first failure is printed, so a bad camera can't flood stderr.
+        """
+        with self._lock:
+            self.decode_errors += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            first = self.decode_errors == 1
+        if first:
+            print(f"QR decode failed (further failures are only counted): {self.last_error}", file=sys.stderr)
+
+    def summary(self, ring=None):
+        with self._lock:
+            latencies = list(self.latencies)
+            elapsed = time.perf_counter() - self.started
+            return {
+                "captured": self.captured,
+                "throttled": self.throttled,
+                "decoded_frames": self.decoded_frames,
+                "dropped_frames": ring.dropped if ring else 0,
+                "results": self.results,
+                "results_dropped": self.results_dropped,
+                "decode_errors": self.decode_errors,
+                "capture_fps": round(self.captured / elapsed, 1) if elapsed else 0.0,
+                "decode_fps": round(self.decoded_frames / elapsed, 1) if elapsed else 0.0,
+                "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            }
+
+
+class ScanPipeline:
+    """
+    Capture thread + decode workers around a cv2.VideoCapture source.
+
+    By default frames go through a RoiDecoder wrapping the configured
+    decoder chain; pass `decoder` to decode full frames with something else.
+
+    `realtime` paces file sources at their native frame rate so they behave
+    like a camera; it defaults to on for files and off for cameras.
+    `max_fps` caps how many frames per second are handed to the decoders
+    (the rest are only shown). With `workers=0` only the capture thread
+    runs and another consumer takes frames from `ring`.
+    """
+
+    def __init__(self, source=0, buffer_size=2, workers=1, decoder=None, realtime=None, max_results=256,
+                 max_fps=None, ring=None):
+        self.source = source
+        self.decoder = decoder or RoiDecoder()
+        self.workers = workers
+        self.realtime = realtime if realtime is not None else isinstance(source, str) and os.path.isfile(source)
+        self.max_fps = max_fps
+        self.ring = ring if ring is not None else FrameRing(buffer_size)
+        self.stats = ScanStats()
+        self.latest_frame = None
+        self.capture_failed = False
+        self._results = queue.Queue(maxsize=max_results)
+        self._stop = threading.Event()
+        self._capture_done = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._capture_loop, name="qr-capture", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._decode_loop, name=f"qr-decode-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.ring.close()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def finished(self):
+        """
+        True once the source is exhausted (or failed) and all workers have drained it.
+        """
+        return self._capture_done.is_set() and not any(
+            thread.is_alive() for thread in self._threads[1:]
+        )
+
+    def _capture_loop(self):
+        import cv2
+
+        cap = cv2.VideoCapture(self.source)
+        frame_interval = 0.0
+        if self.realtime:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        min_interval = 1.0 / self.max_fps if self.max_fps else 0.0
+        next_frame_at = time.perf_counter()
+        last_queued = float("-inf")
+        frame_index = 0
+        try:
+            if not cap.isOpened():
+                self.capture_failed = True
+                return
+            while not self._stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    self.capture_failed = frame_index == 0
+                    break
+                captured_at = time.perf_counter()
+                self.latest_frame = frame
+                self.stats.captured += 1
+                if captured_at - last_queued >= min_interval:
+                    last_queued = captured_at
+                    self.ring.put((frame_index, captured_at, frame))
+                else:
+                    self.stats.throttled += 1
+                frame_index += 1
+                if frame_interval:
+                    next_frame_at += frame_interval
+                    delay = next_frame_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            cap.release()
+            self._capture_done.set()
+            self.ring.close()
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            item = self.ring.take_newest(timeout=0.5)
+            if item is None:
+                if self.ring.closed:
+                    return
+                continue
+            frame_index, captured_at, frame = item
+            try:
+                decoded_objects = self.decoder(frame)
+            except Exception as e:
+                # One bad frame must not end the worker, or `finished` never turns true for a camera
+                self.stats.record_error(e)
+                continue
+            latency = time.perf_counter() - captured_at
+            self.stats.record_frame(latency, len(decoded_objects))
+            for obj in decoded_objects:
+                result = ScanResult(obj.data.decode("utf-8", errors="replace"), obj.polygon, obj.rect, frame_index,
+                                    latency)
+                try:
+                    self._results.put_nowait(result)
+                except queue.Full:
+                    self.stats.results_dropped += 1
+
+    def get_result(self, timeout=None):
+        """
+        Returns the next ScanResult, or None if nothing arrives within `timeout`.
+        """
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain_results(self):
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def summary(self):
+        summary = self.stats.summary(self.ring)
+        if isinstance(self.decoder, RoiDecoder):
+            summary["roi_hits"] = self.decoder.roi_hits
+            summary["rescans"] = self.decoder.rescans
+        return summary
+
+
+def parse_source(source):
+    return int(source) if source.isdigit() else source
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan QR codes from a camera, video file or stream.")
+    parser.add_argument("source", help="Camera index, video file path or stream URL")
+    parser.add_argument("--workers", type=int, default=1, help="Decode worker threads")
+    parser.add_argument("--buffer", type=int, default=2, help="Ring buffer size in frames")
+    parser.add_argument("--scale", type=float, default=0.5, help="Downscale factor for the detection pass")
+    parser.add_argument("--max-misses", type=int, default=5, help="ROI misses before a full-frame rescan")
+    parser.add_argument("--no-realtime", action="store_true", help="Read file sources as fast as possible")
+    parser.add_argument("--max-fps", type=float, default=None, help="Cap on frames per second sent to the decoders")
+    args = parser.parse_args(argv)
+
+    realtime = False if args.no_realtime else None
+    decoder = RoiDecoder(scale=args.scale, max_misses=args.max_misses)
+    with ScanPipeline(parse_source(args.source), args.buffer, args.workers, decoder, realtime,
+                      max_fps=args.max_fps) as pipeline:
+        try:
+            while not pipeline.finished:
+                result = pipeline.get_result(timeout=0.5)
+                if result:
+                    print(f"frame {result.frame_index}: {result.data} ({result.latency * 1000:.1f} ms)")
+        except KeyboardInterrupt:
+            pass
+        for result in pipeline.drain_results():
+            print(f"frame {result.frame_index}: {result.data} ({result.latency * 1000:.1f} ms)")
+    print(pipeline.summary(), file=sys.stderr)
+    for row in stage_summary():
+        print(row, file=sys.stderr)
+    return 1 if pipeline.capture_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
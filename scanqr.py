@@ -1,44 +1,112 @@
+"""
+Live QR scanner window over the capture/decode pipeline.
+
+`scan_loop` is the display loop; benchmarks.py replays it on synthetic
+videos with the window turned off, so it measures the loop that ships.
+
+    python scanqr.py
+"""
+import sys
+import time
+
 import cv2
-from pyzbar.pyzbar import decode
 import numpy as np  # Import NumPy for point handling
 
-# Start video capture (0 is the default camera)
-cap = cv2.VideoCapture(0)
-
-print("Scanning for QR codes. Press 'q' to quit.")
-
-while True:
-    # Read a frame from the camera
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    # Decode the QR codes in the frame
-    decoded_objects = decode(frame)
-    for obj in decoded_objects:
-        # Extract the data from the QR code
-        qr_data = obj.data.decode("utf-8")
-        print(f"Decoded Data: {qr_data}")
-
-        # Draw a rectangle around the QR code
-        points = obj.polygon
-        if len(points) == 4:  # Ensure it forms a quadrilateral
-            # Convert points to a NumPy array with integer coordinates
-            pts = np.array([(point.x, point.y) for point in points], dtype=np.int32)
-            # Draw the rectangle
-            cv2.polylines(frame, [pts], isClosed=True, color=(0, 255, 0), thickness=3)
-
-        # Put the decoded data on the frame
-        cv2.putText(frame, qr_data, (obj.rect.left, obj.rect.top - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-    # Display the video with QR code overlays
-    cv2.imshow("QR Code Scanner", frame)
-
-    # Quit if 'q' is pressed
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# Release the camera and close all OpenCV windows
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+import instrumentation
+import qr_chunks
+from scan_pipeline import ScanPipeline
+
+# How long an overlay stays on screen after its QR code was last decoded
+OVERLAY_TTL = 0.5
+
+
+def scan_loop(pipeline, show=True, on_payload=None):
+    """
+    Draws overlays for decoded codes on the newest frame until the pipeline finishes
+    (or 'q' is pressed when `show`). Complete payloads go to `on_payload` (default: print).
+
+    Returns {"overlays_drawn", "payloads"}.
+    """
+    overlays = {}
+    # Chunked payloads are reassembled as their codes come into view, in any order
+    reassembler = qr_chunks.Reassembler()
+    last_frame = None
+    drawn = 0
+    payloads = 0
+    while not pipeline.finished:
+        # Show the newest captured frame; decoding happens on the worker threads
+        frame = pipeline.latest_frame
+        if frame is None or frame is last_frame:
+            if show:
+                if cv2.waitKey(5) & 0xFF == ord('q'):
+                    break
+            else:
+                time.sleep(0.001)
+            continue
+        last_frame = frame
+
+        now = time.perf_counter()
+        for result in pipeline.drain_results():
+            payload = reassembler.add(result.data)
+            if payload is not None:
+                payloads += 1
+                if on_payload is None:
+                    print(f"Decoded Data: {payload}")
+                else:
+                    on_payload(payload)
+            overlays[result.data] = (now, result)
+
+        # Only copy and draw on the frame when there is something to overlay
+        if overlays:
+            frame = frame.copy()
+
+        for qr_data, (seen_at, result) in list(overlays.items()):
+            if now - seen_at > OVERLAY_TTL:
+                del overlays[qr_data]
+                continue
+
+            # Draw a rectangle around the QR code
+            points = result.polygon
+            if len(points) == 4:  # Ensure it forms a quadrilateral
+                # Convert points to a NumPy array with integer coordinates
+                pts = np.array([(point.x, point.y) for point in points], dtype=np.int32)
+                # Draw the rectangle
+                cv2.polylines(frame, [pts], isClosed=True, color=(0, 255, 0), thickness=3)
+
+            # Put the decoded data (or the chunk's place in its sequence) on the frame
+            chunk = qr_chunks.parse_chunk(qr_data)
+            label = f"part {chunk.index} of {chunk.count}" if chunk else qr_data
+            cv2.putText(frame, label, (result.rect.left, result.rect.top - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            drawn += 1
+
+        if show:
+            # Display the video with QR code overlays
+            cv2.imshow("QR Code Scanner", frame)
+
+            # Quit if 'q' is pressed
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    return {"overlays_drawn": drawn, "payloads": payloads}
+
+
+def main():
+    # Start the capture/decode pipeline (0 is the default camera)
+    pipeline = ScanPipeline(0).start()
+
+    print("Scanning for QR codes. Press 'q' to quit.")
+    try:
+        scan_loop(pipeline)
+    finally:
+        # Stop the pipeline and close all OpenCV windows
+        pipeline.stop()
+        cv2.destroyAllWindows()
+    print(pipeline.summary())
+    if instrumentation.is_enabled():
+        for row in instrumentation.summary():
+            print(row)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
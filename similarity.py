@@ -0,0 +1,207 @@
+"""
+Field-aware, linear-time profile similarity.
+
+Profiles are flattened to dotted field paths ("habits.hobbies"). List fields
+are compared by set overlap (Jaccard) and scalars by normalized equality.
+The weighted mean over fields present in either profile is returned as a
+0-100 percentage, same as the old SequenceMatcher-based score.
+
+    python similarity.py --bench
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from difflib import SequenceMatcher
+
+# List fields of the app.py/demo.py profile and app_beta.py's nested habits
+LIST_FIELDS = (
+    "hobbies",
+    "tastes",
+    "skills",
+    "preferences",
+    "habits.morning_routine",
+    "habits.dietary_preferences",
+    "habits.hobbies",
+)
+
+DEFAULT_WEIGHTS = {
+    "name": 1.0,
+    "age": 0.5,
+    "email": 2.0,
+    "phone": 2.0,
+    "address": 1.0,
+    "hobbies": 1.0,
+    "tastes": 1.0,
+    "skills": 1.0,
+    "preferences": 1.0,
+    "habits.morning_routine": 1.0,
+    "habits.dietary_preferences": 1.0,
+    "habits.hobbies": 1.0,
+    "habits.sleep_schedule.bedtime": 0.5,
+    "habits.sleep_schedule.wake_time": 0.5,
+}
+
+# Weight for fields that are not in DEFAULT_WEIGHTS
+DEFAULT_OTHER_WEIGHT = 1.0
+
+_WHITESPACE = re.compile(r"\s+")
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_text(value):
+    return _WHITESPACE.sub(" ", str(value)).strip().casefold()
+
+
+def normalize_scalar(field, value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    if field.endswith("phone"):
+        return _NON_DIGITS.sub("", str(value))
+    return normalize_text(value)
+
+
+def flatten_profile(profile, prefix=""):
+    """
+    Flattens nested dicts into {"dotted.path": value}.
+    """
+    flat = {}
+    for key, value in profile.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_profile(value, f"{path}."))
+        else:
+            flat[path] = value
+    return flat
+
+
+def normalize_profile(profile):
+    """
+    Flattened profile with list fields as sets of normalized items and scalars normalized.
+
+    Empty values are dropped so that "" and a missing field count the same.
+    Raises ValueError for anything but a JSON object.
+    """
+    if not isinstance(profile, dict):
+        raise ValueError("profile must be a JSON object")
+    normalized = {}
+    for field, value in flatten_profile(profile).items():
+        if isinstance(value, (list, tuple, set)) or field in LIST_FIELDS:
+            items = value if isinstance(value, (list, tuple, set)) else [value]
+            value = frozenset(normalize_text(item) for item in items) - {""}
+        else:
+            value = normalize_scalar(field, value)
+        if value != "" and value != frozenset():
+            normalized[field] = value
+    return normalized
+
+
+def field_score(a, b):
+    if isinstance(a, frozenset) and isinstance(b, frozenset):
+        return len(a & b) / len(a | b)
+    return 1.0 if a == b else 0.0
+
+
+def profile_similarity(profile1, profile2, weights=None):
+    """
+    Weighted field-by-field similarity of two profiles as a percentage (0-100).
+    """
+    return normalized_similarity(normalize_profile(profile1), normalize_profile(profile2), weights)
+
+
+def normalized_similarity(fields1, fields2, weights=None, shared_only=False):
+    """
+    profile_similarity for profiles already passed through normalize_profile.
+
+    With `shared_only`, fields only one profile fills in are left out instead
+    of counting as mismatches, so a sparse record can still match a full one.
+    """
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    total = 0.0
+    score = 0.0
+    for field in (fields1.keys() & fields2.keys()) if shared_only else (fields1.keys() | fields2.keys()):
+        weight = weights.get(field, DEFAULT_OTHER_WEIGHT)
+        if weight <= 0:
+            continue
+        total += weight
+        if field in fields1 and field in fields2:
+            score += weight * field_score(fields1[field], fields2[field])
+
+    if total == 0:
+        return 100.0
+    return score / total * 100
+
+
+def sequence_similarity(profile1, profile2):
+    """
+    The original text-based score, kept as the benchmark baseline.
+    """
+    profile1_text = json.dumps(profile1, sort_keys=True)
+    profile2_text = json.dumps(profile2, sort_keys=True)
+    return SequenceMatcher(None, profile1_text, profile2_text).ratio() * 100
+
+
+def synthetic_profile(size, rng, vocabulary=None):
+    vocabulary = vocabulary or [f"item{i}" for i in range(size * 4 + 10)]
+    return {
+        "name": f"user {rng.randrange(1000)}",
+        "age": rng.randrange(18, 90),
+        "email": f"user{rng.randrange(1000)}@example.com",
+        "phone": f"+49{rng.randrange(10 ** 9)}",
+        "address": "Prendener Str.12, Berlin, Germany",
+        "hobbies": rng.sample(vocabulary, size),
+        "tastes": rng.sample(vocabulary, size),
+        "skills": rng.sample(vocabulary, size),
+        "preferences": rng.sample(vocabulary, size),
+    }
+
+
+def benchmark(sizes=(10, 100, 1000, 5000), repeat=3, seed=0):
+    """
+    Times profile_similarity against sequence_similarity for growing list sizes.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for size in sizes:
+        profile1 = synthetic_profile(size, rng)
+        profile2 = synthetic_profile(size, rng)
+        row = {"list_size": size, "text_bytes": len(json.dumps(profile1))}
+        for name, func in (("structured", profile_similarity), ("sequence_matcher", sequence_similarity)):
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func(profile1, profile2)
+                best = min(best, time.perf_counter() - started)
+            row[f"{name}_ms"] = round(best * 1000, 3)
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile similarity.")
+    parser.add_argument("profiles", nargs="*", help="Two profile JSON files to compare")
+    parser.add_argument("--bench", action="store_true", help="Benchmark against the SequenceMatcher score")
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="List sizes for --bench")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        for row in benchmark(tuple(int(size) for size in args.sizes.split(","))):
+            print(json.dumps(row))
+        return 0
+    if len(args.profiles) != 2:
+        parser.error("give two profile files or --bench")
+    with open(args.profiles[0]) as file1, open(args.profiles[1]) as file2:
+        profile1, profile2 = json.load(file1), json.load(file2)
+    print(f"structured: {profile_similarity(profile1, profile2):.2f}%")
+    print(f"sequence_matcher: {sequence_similarity(profile1, profile2):.2f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
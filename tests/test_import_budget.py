@@ -0,0 +1,30 @@
+"""
+Import-time budget for the Streamlit apps.
+
+Each app is imported in a fresh interpreter (benchmarks.probe_app_import)
+and must stay within the budget without loading a heavy dependency. Set
+QRDNA_IMPORT_BUDGET_MS to tighten or relax the budget on slow machines.
+"""
+import os
+import statistics
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmarks  # noqa: E402
+
+pytest.importorskip("streamlit")
+
+BUDGET_MS = float(os.environ.get("QRDNA_IMPORT_BUDGET_MS", benchmarks.DEFAULT_IMPORT_BUDGET_MS))
+REPEAT = 3
+
+
+@pytest.mark.parametrize("module", benchmarks.APP_MODULES)
+def test_app_import_budget(module):
+    samples = [benchmarks.probe_app_import(module) for _ in range(REPEAT)]
+    heavy = sorted({name for sample in samples for name in sample["heavy_modules"]})
+    assert not heavy, f"{module} loaded {', '.join(heavy)} at import"
+    median_ms = statistics.median(sample["import_ms"] for sample in samples)
+    assert median_ms <= BUDGET_MS, f"{module} imported in {median_ms:.1f} ms (budget {BUDGET_MS:.0f} ms)"
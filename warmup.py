@@ -0,0 +1,80 @@
+"""
+Optional background warm-up of the heavy dependencies.
+
+The apps import NumPy, SciPy, OpenCV and pyzbar only in the tabs that need
+them, so the first page renders quickly. With QRDNA_WARMUP=1 a daemon
+thread imports them right after start-up, so the first scan or comparison
+doesn't pay for the import either.
+
+    python warmup.py            # time each warm-up import in a fresh interpreter
+"""
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+# Roughly in order of first use: rendering, decoding, matching
+WARMUP_MODULES = (
+    "numpy",
+    "PIL.Image",
+    "cv2",
+    "pyzbar.pyzbar",
+    "scipy.sparse",
+    "profile_index",
+    "profile_vectors",
+)
+
+_started = False
+_lock = threading.Lock()
+timings = {}
+
+
+def warm(modules=WARMUP_MODULES):
+    """
+    Imports `modules` in order and records how long each took; missing ones are skipped.
+    """
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except (ImportError, OSError):
+            # e.g. pyzbar without the zbar shared library
+            timings[name] = None
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
+
+
+def warmup_enabled():
+    return os.environ.get("QRDNA_WARMUP", "") not in ("", "0")
+
+
+def start_warmup(modules=WARMUP_MODULES, force=False):
+    """
+    Starts the warm-up thread once per process (Streamlit reruns call this on every interaction).
+    Does nothing unless QRDNA_WARMUP is set or `force` is true.
+    """
+    global _started
+    if not (force or warmup_enabled()):
+        return None
+    with _lock:
+        if _started:
+            return None
+        _started = True
+    thread = threading.Thread(target=warm, args=(modules,), name="qrdna-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    modules = (sys.argv[1:] if argv is None else argv) or WARMUP_MODULES
+    started = time.perf_counter()
+    warm(modules)
+    print(json.dumps({"modules_ms": timings, "total_ms": round((time.perf_counter() - started) * 1000, 1)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())